@@ -1,22 +1,12 @@
-import requests
 from decimal import Decimal
 
+from crypto.lots import FifoLots
+from crypto.notifications import notify
 
-def telegram_bot_sendtext(bot_message):
-    bot_token = "5687151976:AAF94-ghuVdi3yBxDYwYzPC_MOHrM7D40pg"
-    bot_chatID = "-1002000333988"
-    send_text = (
-        "https://api.telegram.org/bot"
-        + bot_token
-        + "/sendMessage?chat_id="
-        + bot_chatID
-        + "&parse_mode=Markdown&text="
-        + bot_message
-    )
-
-    response = requests.get(send_text)
 
-    return response.json()
+def telegram_bot_sendtext(bot_message):
+    """Queues the message for the send_notifications task instead of sending inline"""
+    return notify(bot_message)
 
 
 def calculate_future_apr(long_price, short_price, days):
@@ -100,70 +90,10 @@ def determine_price_str(price):
 
 
 def calculate_spot_fifo_average_cost(transactions):
-    buy_transactions = [t for t in transactions if t["side"] == "open"]
-    sell_transactions = [t for t in transactions if t["side"] == "close"]
-
-    for sell_transaction in sell_transactions:
-        sell_quantity = sell_transaction["spot_quantity"]
-
-        for buy_transaction in buy_transactions[:]:
-            buy_quantity = buy_transaction["spot_quantity"]
-
-            if buy_quantity > sell_quantity:
-                buy_transaction["spot_quantity"] -= sell_quantity
-                sell_quantity = 0
-                break
-
-            elif buy_quantity == sell_quantity:
-                buy_transactions.remove(buy_transaction)
-                sell_quantity = 0
-                break
-
-            else:
-                buy_transactions.remove(buy_transaction)
-                sell_quantity -= buy_quantity
-
-        if sell_quantity > 0:
-            sell_transaction["spot_quantity"] = sell_quantity
-
-    total_quantity = sum([t["spot_quantity"] for t in buy_transactions])
-    total_price = sum(
-        [t["spot_cost_price"] * t["spot_quantity"] for t in buy_transactions]
-    )
-    average_cost = total_price / total_quantity
-    return average_cost
+    lots = FifoLots("spot_quantity", "spot_cost_price").extend(transactions)
+    return lots.average_cost()
 
 
 def calculate_hedge_fifo_average_cost(transactions):
-    buy_transactions = [t for t in transactions if t["side"] == "open"]
-    sell_transactions = [t for t in transactions if t["side"] == "close"]
-
-    for sell_transaction in sell_transactions:
-        sell_quantity = sell_transaction["hedge_quantity"]
-
-        for buy_transaction in buy_transactions[:]:
-            buy_quantity = buy_transaction["hedge_quantity"]
-
-            if buy_quantity > sell_quantity:
-                buy_transaction["hedge_quantity"] -= sell_quantity
-                sell_quantity = 0
-                break
-
-            elif buy_quantity == sell_quantity:
-                buy_transactions.remove(buy_transaction)
-                sell_quantity = 0
-                break
-
-            else:
-                buy_transactions.remove(buy_transaction)
-                sell_quantity -= buy_quantity
-
-        if sell_quantity > 0:
-            sell_transaction["hedge_quantity"] = sell_quantity
-
-    total_quantity = sum([t["hedge_quantity"] for t in buy_transactions])
-    total_price = sum(
-        [t["hedge_cost_price"] * t["hedge_quantity"] for t in buy_transactions]
-    )
-    average_cost = total_price / total_quantity
-    return average_cost
+    lots = FifoLots("hedge_quantity", "hedge_cost_price").extend(transactions)
+    return lots.average_cost()
@@ -0,0 +1,130 @@
+import math
+import time
+from collections import OrderedDict
+
+
+# Spread pairs kept, the least recently used ones are evicted with their series
+CANDLE_STORE_SIZE = 100
+
+
+class CandleStore:
+    """Keeps recent candles per (exchange, symbol, interval), fetching only newer ones
+
+    Spreads between a spot and a swap series are joined on candle timestamp and
+    kept as running sums, so only the candles that changed are re-evaluated.
+    Series are shared between pairs, every pair collects the timestamps changed
+    since its own spreads were last updated.
+    """
+
+    def __init__(self, size=CANDLE_STORE_SIZE):
+        self.size = size
+        self.series = {}
+        self.spreads = OrderedDict()
+        self.dirty = {}
+        self.fetched = {}
+
+    def update(self, exchange, symbol, interval, limit):
+        """Appends candles newer than the last stored one, returns changed timestamps"""
+        key = (exchange.id, symbol, interval)
+        candles = self.series.get(key)
+        interval_ms = exchange.parse_timeframe(interval) * 1000
+        now_ms = time.time() * 1000
+
+        if candles and now_ms - next(reversed(candles)) < limit * interval_ms:
+            # The last stored candle may still be open, it is fetched again
+            since = next(reversed(candles))
+            new_candles = exchange.fetch_ohlcv(symbol, interval, since, limit)
+        else:
+            candles = OrderedDict()
+            new_candles = exchange.fetch_ohlcv(symbol, interval, limit=limit)
+
+        changed = set()
+        for candle in new_candles:
+            if candles.get(candle[0]) != candle:
+                candles[candle[0]] = candle
+                changed.add(candle[0])
+
+        while len(candles) > limit:
+            candles.popitem(last=False)
+
+        self.series[key] = candles
+        self.fetched[key] = len(new_candles)
+
+        for pair, dirty in self.dirty.items():
+            if key in pair:
+                dirty |= changed
+        return changed
+
+    def update_spread(self, spot_key, swap_key):
+        spot = self.series[spot_key]
+        swap = self.series[swap_key]
+        pair = (spot_key, swap_key)
+
+        stats = self.spreads.get(pair)
+        if stats is None:
+            stats = {"spreads": {}, "total": 0, "total_squares": 0}
+            self.spreads[pair] = stats
+            changed = spot.keys()
+        else:
+            changed = self.dirty[pair]
+            self.spreads.move_to_end(pair)
+
+        spreads = stats["spreads"]
+        stale = [ts for ts in spreads if ts not in spot or ts not in swap]
+        for ts in stale:
+            self.remove_spread(stats, ts)
+
+        for ts in changed:
+            self.remove_spread(stats, ts)
+            if ts not in spot or ts not in swap:
+                continue
+
+            # Candles without a low, or a zero spot low, have no spread
+            spot_low = spot[ts][3]
+            swap_low = swap[ts][3]
+            if not spot_low or swap_low is None:
+                continue
+
+            spread = (swap_low / spot_low) - 1
+            spreads[ts] = spread
+            stats["total"] += spread
+            stats["total_squares"] += spread * spread
+
+        self.dirty[pair] = set()
+        self.evict()
+        return stats
+
+    def remove_spread(self, stats, ts):
+        spread = stats["spreads"].pop(ts, None)
+        if spread is not None:
+            stats["total"] -= spread
+            stats["total_squares"] -= spread * spread
+
+    def evict(self):
+        while len(self.spreads) > self.size:
+            pair, _ = self.spreads.popitem(last=False)
+            self.dirty.pop(pair, None)
+
+        used = {key for pair in self.spreads for key in pair}
+        for key in [key for key in self.series if key not in used]:
+            del self.series[key]
+            self.fetched.pop(key, None)
+
+    def spread_stats(
+        self, spot_api, spot_symbol, swap_api, swap_symbol, interval, limit
+    ):
+        """Mean, std and count of swap low / spot low - 1 over the matching candles"""
+        self.update(spot_api, spot_symbol, interval, limit)
+        self.update(swap_api, swap_symbol, interval, limit)
+
+        stats = self.update_spread(
+            (spot_api.id, spot_symbol, interval), (swap_api.id, swap_symbol, interval)
+        )
+
+        count = len(stats["spreads"])
+        if count == 0:
+            raise ValueError(f"No matching candles for {spot_symbol} and {swap_symbol}")
+
+        mean = stats["total"] / count
+        variance = max(stats["total_squares"] / count - mean * mean, 0)
+        return {"mean": mean, "std": math.sqrt(variance), "count": count}
@@ -0,0 +1,163 @@
+import threading
+import time
+
+import ccxt
+
+from crypto.http_transport import get_http_session
+from crypto.market_cache import market_cache
+from crypto.market_metadata import get_markets_version, get_markets_diff
+
+
+# Seconds between market version checks of an exchange
+METADATA_CHECK_INTERVAL = 5
+
+_lock = threading.RLock()
+_clients = {}
+_metadata = {}
+_local = threading.local()
+
+
+def load_metadata(exchange_id):
+    return {
+        "version": get_markets_version(exchange_id),
+        "markets": market_cache.get(f"{exchange_id}_markets"),
+        "currencies": market_cache.get(f"{exchange_id}_currencies"),
+        "markets_by_id": market_cache.get(f"{exchange_id}_markets_by_id"),
+    }
+
+
+def patch_markets_by_id(markets_by_id, old_markets, new_markets, symbols):
+    markets_by_id = dict(markets_by_id)
+
+    for symbol in symbols:
+        for markets, keep in ((old_markets, False), (new_markets, True)):
+            market = markets.get(symbol)
+            if market is None:
+                continue
+
+            same_id = [
+                m for m in markets_by_id.get(market["id"], []) if m["symbol"] != symbol
+            ]
+            if keep:
+                same_id.append(market)
+            if same_id:
+                markets_by_id[market["id"]] = same_id
+            else:
+                markets_by_id.pop(market["id"], None)
+
+    return markets_by_id
+
+
+def apply_markets_diff(exchange_id, metadata, diff):
+    """Patches only the symbols listed in the diff instead of reloading everything"""
+    markets = dict(metadata["markets"])
+    for symbol in diff["removed"]:
+        markets.pop(symbol, None)
+    markets.update(diff["markets"])
+
+    symbols = diff["added"] + diff["removed"] + diff["changed"]
+    markets_by_id = patch_markets_by_id(
+        metadata["markets_by_id"], metadata["markets"], markets, symbols
+    )
+
+    currencies = metadata["currencies"]
+    if diff["currencies"]:
+        currencies = market_cache.get(f"{exchange_id}_currencies")
+
+    return {
+        "version": diff["version"],
+        "markets": markets,
+        "currencies": currencies,
+        "markets_by_id": markets_by_id,
+    }
+
+
+def refresh_metadata(exchange_id):
+    metadata = _metadata.get(exchange_id)
+    if metadata and time.time() - metadata["checked"] < METADATA_CHECK_INTERVAL:
+        return metadata
+
+    version = get_markets_version(exchange_id)
+    if metadata is None or not metadata["markets"]:
+        metadata = load_metadata(exchange_id)
+    elif version != metadata["version"]:
+        diff = get_markets_diff(exchange_id)
+        if (
+            diff
+            and diff["version"] == version
+            and diff["previous_version"] == metadata["version"]
+            and isinstance(diff.get("markets"), dict)
+            and metadata["markets_by_id"]
+            and isinstance(next(iter(metadata["markets_by_id"].values())), list)
+        ):
+            metadata = apply_markets_diff(exchange_id, metadata, diff)
+        else:
+            metadata = load_metadata(exchange_id)
+
+    metadata["checked"] = time.time()
+    _metadata[exchange_id] = metadata
+    return metadata
+
+
+def get_metadata(exchange_id):
+    """refresh_metadata under the pool lock, for clients kept outside the pool"""
+    with _lock:
+        return refresh_metadata(exchange_id)
+
+
+def attach_metadata(exchange, metadata):
+    exchange.markets = metadata["markets"]
+    exchange.currencies = metadata["currencies"]
+    exchange.markets_by_id = metadata["markets_by_id"]
+
+
+def pooled_client(clients, exchange_id, default_type, credentials):
+    key = (exchange_id, default_type, tuple(sorted(credentials.items())))
+    metadata = refresh_metadata(exchange_id)
+    entry = clients.get(key)
+
+    if entry is None:
+        exchange_class = getattr(ccxt, exchange_id)
+        exchange = exchange_class(
+            {
+                **credentials,
+                "session": get_http_session(),
+                "options": {
+                    "defaultType": default_type,
+                },
+            }
+        )
+        entry = {"exchange": exchange, "metadata": None}
+        clients[key] = entry
+
+    if entry["metadata"] is not metadata:
+        attach_metadata(entry["exchange"], metadata)
+        entry["metadata"] = metadata
+
+    return entry["exchange"]
+
+
+def get_client(exchange_id, default_type, credentials=None):
+    """Returns the process-wide ccxt client for (exchange_id, defaultType, credentials)
+
+    Clients are created on first use, reuse the keep-alive connections of the
+    process-wide HTTP session and share the cached market metadata of their
+    exchange, which is re-attached only when the markets version changes.
+    """
+    with _lock:
+        return pooled_client(_clients, exchange_id, default_type, credentials or {})
+
+
+def get_thread_client(exchange_id, default_type, credentials=None):
+    """get_client for clients used by the calling thread only
+
+    A ccxt client keeps per-request state such as nonces, rate limit timestamps
+    and the last response, so threads fetching at the same time need their own.
+    The clients are dropped with their thread.
+    """
+    clients = getattr(_local, "clients", None)
+    if clients is None:
+        clients = _local.clients = {}
+
+    with _lock:
+        return pooled_client(clients, exchange_id, default_type, credentials or {})
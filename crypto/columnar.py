@@ -0,0 +1,70 @@
+import io
+import numpy as np
+from django.core.cache import cache
+
+
+PRICE_COLUMNS = ["bid", "ask", "last", "baseVolume", "quoteVolume", "taker", "maker"]
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_columnar_snapshot(_dict):
+    """Flattens a spot/swap/future dict into one row per (symbol, exchange)
+
+    Symbols and exchanges are interned, rows reference them by index in the
+    "symbols" and "exchanges" tables.
+    """
+    symbols = list(_dict)
+    exchanges = {}
+    symbol_ids = []
+    exchange_ids = []
+    columns = {column: [] for column in PRICE_COLUMNS}
+
+    for symbol_id, ticker in enumerate(symbols):
+        for exchange, values in _dict[ticker]["exchanges"].items():
+            if exchange not in exchanges:
+                exchanges[exchange] = len(exchanges)
+
+            symbol_ids.append(symbol_id)
+            exchange_ids.append(exchanges[exchange])
+            for column in PRICE_COLUMNS:
+                columns[column].append(to_float(values.get(column)))
+
+    snapshot = {
+        "symbols": np.array(symbols, dtype=str),
+        "exchanges": np.array(list(exchanges), dtype=str),
+        "symbol": np.array(symbol_ids, dtype=np.int32),
+        "exchange": np.array(exchange_ids, dtype=np.int16),
+    }
+    for column in PRICE_COLUMNS:
+        snapshot[column] = np.array(columns[column], dtype=np.float64)
+
+    return snapshot
+
+
+def pack_snapshot(snapshot):
+    buffer = io.BytesIO()
+    np.savez(buffer, **snapshot)
+    return buffer.getvalue()
+
+
+def unpack_snapshot(blob):
+    with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def set_columnar_snapshot(_type, _dict, timeout=300):
+    cache.set(f"{_type}_columnar", pack_snapshot(build_columnar_snapshot(_dict)), timeout)
+
+
+def get_columnar_snapshot(_type):
+    blob = cache.get(f"{_type}_columnar")
+    if blob is None:
+        return None
+
+    return unpack_snapshot(blob)
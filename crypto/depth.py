@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def build_depth_profiles(depths):
+    """Stacks order book sides into zero padded (books x levels) prefix arrays
+
+    "notional" and "quantity" hold the cumulative price * qty and qty up to and
+    including each level, "lengths" the real number of levels of every book.
+    """
+    lengths = np.array([len(depth) for depth in depths], dtype=np.int64)
+    width = max(int(lengths.max()) if len(lengths) else 0, 1)
+
+    prices = np.zeros((len(depths), width))
+    quantities = np.zeros((len(depths), width))
+    for row, depth in enumerate(depths):
+        if len(depth):
+            levels = np.asarray(depth, dtype=np.float64)
+            prices[row, : len(depth)] = levels[:, 0]
+            quantities[row, : len(depth)] = levels[:, 1]
+
+    return {
+        "prices": prices,
+        "quantities": quantities,
+        "notional": np.cumsum(prices * quantities, axis=1),
+        "quantity": np.cumsum(quantities, axis=1),
+        "lengths": lengths,
+    }
+
+
+def average_prices(profiles, budgets):
+    """Average fill price and reachability of every budget on every book
+
+    Same semantics as calculate_avg_price: a budget is reached on the first
+    level where the cumulative notional exceeds it, otherwise the whole book is
+    averaged. Returns two (books x budgets) arrays.
+    """
+    budgets = np.asarray(budgets, dtype=np.float64)
+    rows = np.arange(len(profiles["lengths"]))[:, None]
+    lengths = profiles["lengths"][:, None]
+    notional = profiles["notional"]
+    quantity = profiles["quantity"]
+
+    # Levels fully bought by each budget, the next level is filled partially.
+    # Cumulative notional never decreases, padding repeats the book total.
+    index = np.array(
+        [np.searchsorted(row, budgets, side="right") for row in notional],
+        dtype=np.int64,
+    ).reshape(len(notional), len(budgets))
+    reached = index < lengths
+    level = np.minimum(index, np.maximum(lengths - 1, 0))
+
+    price = profiles["prices"][rows, level]
+    level_qty = profiles["quantities"][rows, level]
+    notional_before = notional[rows, level] - price * level_qty
+    quantity_before = quantity[rows, level] - level_qty
+
+    last = np.maximum(profiles["lengths"] - 1, 0)
+    total_notional = notional[rows[:, 0], last][:, None]
+    total_quantity = quantity[rows[:, 0], last][:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        filled_quantity = np.where(
+            reached,
+            quantity_before + (budgets[None, :] - notional_before) / price,
+            total_quantity,
+        )
+        filled_notional = np.where(reached, budgets[None, :], total_notional)
+        average = np.where(filled_quantity > 0, filled_notional / filled_quantity, 0)
+
+    return average, reached
+
+
+def depth_average_prices(depth, budgets):
+    """[(average_price, reached), ...] for each budget on a single book side"""
+    average, reached = average_prices(build_depth_profiles([depth]), budgets)
+    return list(zip(average[0].tolist(), reached[0].tolist()))
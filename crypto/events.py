@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import traceback
+from urllib.parse import parse_qs
+
+import orjson
+import redis.asyncio as aioredis
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PREFIX = "octochain_events:"
+# Per symbol top of book channels, e.g. octochain_prices:BTC/USDT:USDT
+PRICES_PREFIX = "octochain_prices:"
+# Last published bid/ask per symbol, a hash per exchange and type
+TOP_OF_BOOK_PREFIX = "octochain_top_of_book:"
+SSE_PATH = "/api/crypto/stream"
+# Frames a slow client may have pending before it is disconnected
+EVENT_QUEUE_SIZE = 256
+KEEPALIVE_INTERVAL = 15
+
+
+def publish_event(event, data):
+    """Publishes to every dashboard stream, failures never reach the producer"""
+    try:
+        connection = get_redis_connection("default")
+        connection.publish(
+            f"{EVENTS_PREFIX}{event}",
+            orjson.dumps(
+                data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            ),
+        )
+    except:
+        logger.error(traceback.format_exc())
+
+
+def exchange_prices(values):
+    return {
+        exchange: (
+            exchange_values.get("bid"),
+            exchange_values.get("ask"),
+            exchange_values.get("last"),
+        )
+        for exchange, exchange_values in values["exchanges"].items()
+    }
+
+
+def publish_price_deltas(_type, snapshot, tickers, previous):
+    """Sends the bid/ask/last that changed per exchange of the touched tickers
+
+    previous holds the touched tickers as cached before this snapshot, so the
+    deltas do not depend on which worker built the last one. An exchange that
+    left a ticker is sent as None, a removed ticker as None.
+    """
+    deltas = {}
+    for ticker in tickers:
+        values = snapshot.get(ticker)
+        before = previous.get(ticker)
+        if values is None:
+            if before is not None:
+                deltas[ticker] = None
+            continue
+
+        current = exchange_prices(values)
+        last = exchange_prices(before) if before is not None else {}
+        changed = {
+            exchange: dict(zip(("bid", "ask", "last"), prices))
+            for exchange, prices in current.items()
+            if last.get(exchange) != prices
+        }
+        for exchange in set(last) - set(current):
+            changed[exchange] = None
+
+        if changed:
+            deltas[ticker] = changed
+
+    if deltas:
+        publish_event("prices", {"type": _type, "tickers": deltas})
+
+
+def price_channel(symbol):
+    return f"{PRICES_PREFIX}{symbol}"
+
+
+def top_of_book_key(exchange_id, _type):
+    return f"{TOP_OF_BOOK_PREFIX}{exchange_id}_{_type}"
+
+
+def publish_price_changes(exchange_id, _type, prices, timeout=300):
+    """Publishes bid/ask on the symbol channel of every ticker whose top of book
+    moved since it was last published
+
+    The published tops are kept in a Redis hash per exchange and type, so the
+    ingest workers and streams publishing an exchange share them.
+    """
+    key = top_of_book_key(exchange_id, _type)
+    try:
+        connection = get_redis_connection("default")
+        published = connection.hgetall(key)
+
+        changed, tops = {}, {}
+        for symbol, ticker in prices.items():
+            bid, ask = ticker.get("bid"), ticker.get("ask")
+            top = orjson.dumps([bid, ask])
+            if published.get(symbol.encode()) != top:
+                changed[symbol] = (bid, ask)
+                tops[symbol] = top
+
+        if not changed:
+            return 0
+
+        pipeline = connection.pipeline(transaction=False)
+        for symbol, (bid, ask) in changed.items():
+            message = {"exchange": exchange_id, "type": _type, "bid": bid, "ask": ask}
+            pipeline.publish(price_channel(symbol), orjson.dumps(message))
+        pipeline.hset(key, mapping=tops)
+        pipeline.expire(key, timeout)
+        pipeline.execute()
+    except:
+        logger.error(traceback.format_exc())
+        return 0
+
+    return len(changed)
+
+
+class Subscription:
+    def __init__(self, events):
+        self.events = events
+        self.queue = asyncio.Queue(EVENT_QUEUE_SIZE)
+        self.lagging = False
+
+
+class EventHub:
+    """One Redis pattern subscription per process, fanned out to every stream"""
+
+    def __init__(self, url):
+        self.url = url
+        self.subscriptions = set()
+        self.listener = None
+
+    def subscribe(self, events):
+        subscription = Subscription(events)
+        self.subscriptions.add(subscription)
+
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.ensure_future(self.listen())
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    def broadcast(self, event, frame):
+        for subscription in list(self.subscriptions):
+            if subscription.events and event not in subscription.events:
+                continue
+
+            try:
+                subscription.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                subscription.lagging = True
+                self.subscriptions.discard(subscription)
+
+    async def listen(self):
+        backoff = 1
+        prefix = EVENTS_PREFIX.encode()
+
+        while True:
+            client = aioredis.from_url(self.url)
+            try:
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(f"{EVENTS_PREFIX}*")
+
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+
+                    event = message["channel"][len(prefix) :]
+                    frame = b"event: " + event + b"\ndata: " + message["data"] + b"\n\n"
+                    self.broadcast(event.decode(), frame)
+                    backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except:
+                logger.error(traceback.format_exc())
+            finally:
+                await client.close()
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+_hub = None
+
+
+def get_hub():
+    global _hub
+
+    if _hub is None:
+        _hub = EventHub(settings.CACHES["default"]["LOCATION"])
+    return _hub
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def sse_application(scope, receive, send):
+    """text/event-stream of prices and opportunity events, ?events=prices,... filters"""
+    query = parse_qs(scope.get("query_string", b"").decode())
+    events = {e for value in query.get("events", []) for e in value.split(",") if e}
+
+    hub = get_hub()
+    subscription = hub.subscribe(events)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+
+    headers = [
+        (b"content-type", b"text/event-stream"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]
+    if getattr(settings, "CORS_ALLOW_ALL_ORIGINS", False):
+        headers.append((b"access-control-allow-origin", b"*"))
+
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send(
+            {"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True}
+        )
+
+        while not subscription.lagging:
+            getter = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected},
+                timeout=KEEPALIVE_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                getter.cancel()
+                return
+
+            if getter in done:
+                frames = [getter.result()]
+                while not subscription.queue.empty():
+                    frames.append(subscription.queue.get_nowait())
+                body = b"".join(frames)
+            else:
+                getter.cancel()
+                body = b": keepalive\n\n"
+
+            await send(
+                {"type": "http.response.body", "body": body, "more_body": True}
+            )
+
+        # Lagging clients are cut off, EventSource reconnects and refetches
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    finally:
+        hub.unsubscribe(subscription)
+        disconnected.cancel()
@@ -1,6 +1,8 @@
 import datetime
-from django.core.cache import cache
 
+from crypto.events import publish_event
+from crypto.market_cache import market_cache
+from crypto.market_state import get_snapshot_version
 from crypto.business_functions import (
     calculate_future_apr,
     calculate_spread_rate,
@@ -8,10 +10,12 @@ from crypto.business_functions import (
     calculate_future_real_apr,
 )
 
+FUTURE_ARBITRAGES_KEY = "future_arbitrages"
+
 
 def calculate_future_arbitrage():
-    spot = cache.get("spot")
-    future = cache.get("future")
+    spot = market_cache.get("spot")
+    future = market_cache.get("future")
 
     now = datetime.datetime.now()
 
@@ -64,3 +68,32 @@ def calculate_future_arbitrage():
             arbitrages.append(arbitrage)
 
     return arbitrages
+
+
+def get_future_arbitrages_version():
+    """Version tag of the cached table, also used as the view's ETag"""
+    return market_cache.get(f"{FUTURE_ARBITRAGES_KEY}_version")
+
+
+def get_future_arbitrages():
+    return market_cache.get(FUTURE_ARBITRAGES_KEY)
+
+
+def store_future_arbitrages(timeout=300):
+    """Recomputes the basis table only when the spot or future snapshot changed"""
+    spot_version = get_snapshot_version("spot")
+    future_version = get_snapshot_version("future")
+    if spot_version is None or future_version is None:
+        return None
+
+    version = f"{spot_version}-{future_version}"
+    if get_future_arbitrages_version() == version:
+        market_cache.touch(FUTURE_ARBITRAGES_KEY, timeout)
+        market_cache.touch(f"{FUTURE_ARBITRAGES_KEY}_version", timeout)
+        return version
+
+    table = {"version": version, "arbitrages": calculate_future_arbitrage()}
+    market_cache.set(FUTURE_ARBITRAGES_KEY, table, timeout)
+    market_cache.set(f"{FUTURE_ARBITRAGES_KEY}_version", version, timeout)
+    publish_event(FUTURE_ARBITRAGES_KEY, {"version": version})
+    return version
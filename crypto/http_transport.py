@@ -0,0 +1,105 @@
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+# Exchange hosts kept in the pool and keep-alive connections per host
+POOL_HOSTS = 32
+POOL_CONNECTIONS_PER_HOST = 16
+
+_lock = threading.Lock()
+_session = None
+_stats = defaultdict(lambda: {"requests": 0, "new_connections": 0})
+
+
+def record(host, counter):
+    with _lock:
+        _stats[host][counter] += 1
+
+
+def connection_stats():
+    """Requests, new connections and reused connections per exchange host"""
+    with _lock:
+        return {
+            host: {
+                **values,
+                "reused": max(values["requests"] - values["new_connections"], 0),
+            }
+            for host, values in _stats.items()
+        }
+
+
+def reset_connection_stats():
+    with _lock:
+        _stats.clear()
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        record(self.host, "new_connections")
+        return super()._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        record(self.host, "new_connections")
+        return super()._new_conn()
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs):
+        record(urlparse(request.url).hostname, "requests")
+        return super().send(request, *args, **kwargs)
+
+
+def create_http_session():
+    session = requests.Session()
+    adapter = KeepAliveAdapter(
+        pool_connections=POOL_HOSTS, pool_maxsize=POOL_CONNECTIONS_PER_HOST
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_http_session():
+    """Process-wide requests session shared by every sync ccxt client"""
+    global _session
+
+    with _lock:
+        if _session is None:
+            _session = create_http_session()
+        return _session
+
+
+async def on_request_start(session, context, params):
+    context.host = params.url.host
+    record(context.host, "requests")
+
+
+async def on_connection_create_end(session, context, params):
+    record(getattr(context, "host", None), "new_connections")
+
+
+def create_aiohttp_session():
+    """Keep-alive aiohttp session to share between the async ccxt clients of one event loop"""
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+
+    connector = aiohttp.TCPConnector(
+        limit_per_host=POOL_CONNECTIONS_PER_HOST, keepalive_timeout=60
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import traceback
+
+import ccxt.async_support as ccxt_async
+
+from crypto.http_transport import create_aiohttp_session
+from crypto.market_cache import market_cache
+from crypto.market_state import set_exchange_prices
+from crypto.order_books import async_get_order_book
+from crypto.streaming import is_stream_live
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds the order book fan-out waits before dropping unfinished books
+ORDER_BOOK_DEADLINE = 8
+
+# Max simultaneous REST calls per exchange, others use the default
+DEFAULT_EXCHANGE_CONCURRENCY = 3
+EXCHANGE_CONCURRENCY = {
+    "kucoin": 1,
+    "bitmart": 2,
+}
+
+
+def get_ticker_params(exchange_id, _type):
+    if _type == "future" and exchange_id == "gate":
+        return {"settle": "usdt"}
+
+    return {}
+
+
+async def fetch_type_prices(exchange_id, _type, markets, semaphore, session):
+    exchange = None
+    try:
+        exchange_class = getattr(ccxt_async, exchange_id)
+        exchange = exchange_class(
+            {
+                "session": session,
+                "options": {
+                    "defaultType": _type,
+                },
+            }
+        )
+        exchange.markets = markets
+
+        if exchange.has[_type] == True:
+            async with semaphore:
+                prices = await exchange.fetch_tickers(
+                    params=get_ticker_params(exchange_id, _type)
+                )
+        else:
+            prices = {}
+
+        set_exchange_prices(exchange_id, _type, prices)
+        logger.debug(f"{exchange_id} {_type} prices set!")
+    except:
+        logger.error(f"{exchange_id} {_type} prices failed")
+        logger.error(traceback.format_exc())
+    finally:
+        if exchange:
+            await exchange.close()
+
+
+async def fetch_all_exchange_prices(exchanges):
+    jobs = []
+    session = create_aiohttp_session()
+
+    for exchange_id, values in exchanges.items():
+        markets = market_cache.get(f"{exchange_id}_markets")
+        if not markets:
+            logger.error(f"{exchange_id} has no market details")
+            continue
+
+        semaphore = asyncio.Semaphore(
+            EXCHANGE_CONCURRENCY.get(exchange_id, DEFAULT_EXCHANGE_CONCURRENCY)
+        )
+        for _type in values["types"]:
+            if is_stream_live(exchange_id, _type):
+                continue
+            jobs.append(
+                fetch_type_prices(exchange_id, _type, markets, semaphore, session)
+            )
+
+    try:
+        await asyncio.gather(*jobs, return_exceptions=True)
+    finally:
+        await session.close()
+
+
+def create_async_client(exchange_id, _type, session):
+    exchange_class = getattr(ccxt_async, exchange_id)
+    exchange = exchange_class(
+        {
+            "session": session,
+            "options": {
+                "defaultType": _type,
+            },
+        }
+    )
+    exchange.markets = market_cache.get(f"{exchange_id}_markets")
+    exchange.markets_by_id = market_cache.get(f"{exchange_id}_markets_by_id")
+
+    return exchange
+
+
+async def fetch_order_book(exchange, symbol, limit, semaphore):
+    async with semaphore:
+        return await async_get_order_book(exchange, symbol, limit)
+
+
+async def fetch_order_books(books, deadline=ORDER_BOOK_DEADLINE, limit=20):
+    """Fetches (exchange_id, _type, symbol) books concurrently within one deadline
+
+    Books that fail or are not ready when the deadline passes are left out of
+    the returned {(exchange_id, _type, symbol): order_book} dict.
+    """
+    session = create_aiohttp_session()
+    clients = {}
+    semaphores = {}
+    jobs = {}
+
+    try:
+        for exchange_id, _type, symbol in set(books):
+            if exchange_id not in semaphores:
+                semaphores[exchange_id] = asyncio.Semaphore(
+                    EXCHANGE_CONCURRENCY.get(exchange_id, DEFAULT_EXCHANGE_CONCURRENCY)
+                )
+            if (exchange_id, _type) not in clients:
+                clients[(exchange_id, _type)] = create_async_client(
+                    exchange_id, _type, session
+                )
+
+            jobs[(exchange_id, _type, symbol)] = asyncio.ensure_future(
+                fetch_order_book(
+                    clients[(exchange_id, _type)],
+                    symbol,
+                    limit,
+                    semaphores[exchange_id],
+                )
+            )
+
+        if not jobs:
+            return {}
+
+        done, pending = await asyncio.wait(jobs.values(), timeout=deadline)
+        for job in pending:
+            job.cancel()
+        if pending:
+            logger.info(f"{len(pending)} order books missed the deadline")
+
+        order_books = {}
+        for key, job in jobs.items():
+            if job not in done:
+                continue
+            if job.exception() is not None:
+                logger.error(f"{key} order book failed: {job.exception()}")
+                continue
+            order_books[key] = job.result()
+
+        return order_books
+    finally:
+        await asyncio.gather(
+            *[exchange.close() for exchange in clients.values()],
+            return_exceptions=True,
+        )
+        await session.close()
@@ -0,0 +1,30 @@
+import time
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+
+PRICE_KEYS = "registry_price_keys"
+
+
+def register_key(registry, key, timeout):
+    """Adds a cache key to a registry scored by its expiry timestamp"""
+    connection = get_redis_connection("default")
+    connection.zadd(cache.make_key(registry), {key: time.time() + timeout})
+
+
+def unregister_key(registry, key):
+    connection = get_redis_connection("default")
+    connection.zrem(cache.make_key(registry), key)
+
+
+def live_keys(registry):
+    """Returns registered keys that are not expired yet, pruning the expired ones"""
+    connection = get_redis_connection("default")
+    registry_key = cache.make_key(registry)
+
+    pipeline = connection.pipeline()
+    pipeline.zremrangebyscore(registry_key, "-inf", time.time())
+    pipeline.zrange(registry_key, 0, -1)
+    _, keys = pipeline.execute()
+
+    return [key.decode() for key in keys]
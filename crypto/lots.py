@@ -0,0 +1,100 @@
+from collections import deque
+
+
+# Remainders within this fraction of a lot's opened quantity are float residue
+QUANTITY_EPSILON = 1e-9
+
+
+class FifoLots:
+    """Open lots of one position, consumed first in first out by closes
+
+    quantity_key and price_key select the transaction fields of the side, e.g.
+    spot_quantity/spot_cost_price. Close quantity beyond the open lots is kept
+    and taken from the next opens, as when every close is matched against all
+    opens at once. A lot whose remainder is within QUANTITY_EPSILON of its opened
+    quantity counts as consumed, so float residue never stays open.
+    """
+
+    def __init__(self, quantity_key, price_key):
+        self.quantity_key = quantity_key
+        self.price_key = price_key
+        self.lots = deque()
+        self.unmatched = 0
+        self.quantity = 0
+        self.cost = 0
+        # Quantity subtracted from the running sums since they were last rebuilt
+        self.closed = 0
+
+    def apply(self, transaction):
+        quantity = transaction[self.quantity_key]
+        if transaction["side"] == "open":
+            self.open(quantity, transaction[self.price_key])
+        elif transaction["side"] == "close":
+            self.close(quantity)
+
+    def extend(self, transactions):
+        for transaction in transactions:
+            self.apply(transaction)
+        return self
+
+    def open(self, quantity, price):
+        if self.unmatched > 0:
+            if quantity - self.unmatched <= QUANTITY_EPSILON * quantity:
+                self.unmatched = max(self.unmatched - quantity, 0)
+                return
+            quantity -= self.unmatched
+            self.unmatched = 0
+
+        self.lots.append([quantity, price, quantity])
+        self.quantity += quantity
+        self.cost += quantity * price
+
+    def close(self, quantity):
+        lots = self.lots
+        if not lots:
+            self.unmatched += quantity
+            return
+
+        while lots and quantity > 0:
+            lot = lots[0]
+            tolerance = QUANTITY_EPSILON * lot[2]
+            if lot[0] - quantity > tolerance:
+                lot[0] -= quantity
+                self.quantity -= quantity
+                self.cost -= quantity * lot[1]
+                self.closed += quantity
+                quantity = 0
+            else:
+                lots.popleft()
+                quantity -= lot[0]
+                self.quantity -= lot[0]
+                self.cost -= lot[0] * lot[1]
+                self.closed += lot[0]
+                if quantity <= tolerance:
+                    quantity = 0
+
+        # Subtracting drifts once as much has been closed as is still open, the
+        # sums are then rebuilt from the lots, which keeps closes amortized O(1)
+        if self.closed >= self.quantity:
+            self.quantity = sum(lot[0] for lot in lots)
+            self.cost = sum(lot[0] * lot[1] for lot in lots)
+            self.closed = 0
+        if quantity > 0:
+            self.unmatched += quantity
+
+    def average_cost(self):
+        """Average cost of the open lots, ZeroDivisionError when nothing is open"""
+        return self.cost / self.quantity
+
+    def snapshot(self):
+        return (
+            tuple(tuple(lot) for lot in self.lots),
+            self.unmatched,
+            self.quantity,
+            self.cost,
+            self.closed,
+        )
+
+    def restore(self, snapshot):
+        lots, self.unmatched, self.quantity, self.cost, self.closed = snapshot
+        self.lots = deque(list(lot) for lot in lots)
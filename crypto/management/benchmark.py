@@ -0,0 +1,47 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+
+def measure(func, rounds):
+    """Result of the last call of func and the milliseconds of every call"""
+    durations = []
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return result, durations
+
+
+def timed(func, rounds):
+    """Result of func and the median milliseconds over rounds calls"""
+    result, durations = measure(func, rounds)
+    return result, statistics.median(durations)
+
+
+def percentile(durations, rate):
+    durations = sorted(durations)
+    return durations[max(int(len(durations) * rate) - 1, 0)]
+
+
+class BenchmarkCommand(BaseCommand):
+    """Base of the bench_* commands, subclasses implement benchmark(options)
+
+    rounds is the default of the --rounds option, None for commands without it.
+    """
+
+    rounds = 5
+
+    def add_arguments(self, parser):
+        if self.rounds is not None:
+            parser.add_argument("--rounds", type=int, default=self.rounds)
+
+    def benchmark(self, options):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        self.benchmark(options)
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
@@ -0,0 +1,205 @@
+import copy
+import math
+import random
+import time
+from fractions import Fraction
+
+from crypto.business_functions import calculate_spot_fifo_average_cost
+from crypto.lots import FifoLots
+from crypto.management.benchmark import BenchmarkCommand, timed
+
+
+def synthetic_transactions(count, seed):
+    """Opens and partial closes of one bot, the position never goes short"""
+    rng = random.Random(seed)
+    transactions = []
+    position = 0
+
+    for _ in range(count):
+        quantity = rng.uniform(1, 20)
+        if position > quantity and rng.random() < 0.4:
+            side = "close"
+            position -= quantity
+        else:
+            side = "open"
+            position += quantity
+
+        transactions.append(
+            {
+                "side": side,
+                "spot_quantity": quantity,
+                "spot_cost_price": rng.uniform(0.9, 1.1),
+            }
+        )
+
+    return transactions
+
+
+def partial_close_transactions(count, rng):
+    """Decimal quantities whose closes split lots and often add up to them exactly"""
+    transactions = []
+    position = 0
+
+    for _ in range(count):
+        quantity = round(rng.uniform(0.001, 3), rng.choice([2, 3, 4]))
+        if position > 0 and rng.random() < 0.6:
+            if rng.random() < 0.7:
+                quantity = min(quantity, round(position, 4))
+            transactions.append(
+                {"side": "close", "spot_quantity": quantity, "spot_cost_price": 0}
+            )
+            position -= quantity
+        else:
+            transactions.append(
+                {
+                    "side": "open",
+                    "spot_quantity": quantity,
+                    "spot_cost_price": round(rng.uniform(1, 20), 2),
+                }
+            )
+            position += quantity
+
+    return transactions
+
+
+def exact_fifo_average_cost(transactions):
+    """The reference on the decimal values as fractions, None when nothing is open"""
+    exact = [
+        {
+            "side": t["side"],
+            "spot_quantity": Fraction(str(t["spot_quantity"])),
+            "spot_cost_price": Fraction(str(t["spot_cost_price"])),
+        }
+        for t in transactions
+    ]
+    try:
+        return float(list_fifo_average_cost(exact))
+    except ZeroDivisionError:
+        return None
+
+
+def list_fifo_average_cost(transactions):
+    """The former list.remove based implementation, kept as the reference"""
+    buy_transactions = [t for t in transactions if t["side"] == "open"]
+    sell_transactions = [t for t in transactions if t["side"] == "close"]
+
+    for sell_transaction in sell_transactions:
+        sell_quantity = sell_transaction["spot_quantity"]
+
+        for buy_transaction in buy_transactions[:]:
+            buy_quantity = buy_transaction["spot_quantity"]
+
+            if buy_quantity > sell_quantity:
+                buy_transaction["spot_quantity"] -= sell_quantity
+                sell_quantity = 0
+                break
+
+            elif buy_quantity == sell_quantity:
+                buy_transactions.remove(buy_transaction)
+                sell_quantity = 0
+                break
+
+            else:
+                buy_transactions.remove(buy_transaction)
+                sell_quantity -= buy_quantity
+
+        if sell_quantity > 0:
+            sell_transaction["spot_quantity"] = sell_quantity
+
+    total_quantity = sum([t["spot_quantity"] for t in buy_transactions])
+    total_price = sum(
+        [t["spot_cost_price"] * t["spot_quantity"] for t in buy_transactions]
+    )
+    return total_price / total_quantity
+
+
+class Command(BenchmarkCommand):
+    """Django command to time the FIFO lot engine against the list based rebuild"""
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--transactions", type=int, nargs="+", default=[100, 1000, 5000, 10000]
+        )
+        parser.add_argument("--cases", type=int, default=5000)
+
+    def check_partial_closes(self, cases):
+        rng = random.Random(cases)
+        mismatches = 0
+
+        for _ in range(cases):
+            transactions = partial_close_transactions(rng.randint(1, 14), rng)
+            expected = exact_fifo_average_cost(transactions)
+            try:
+                result = calculate_spot_fifo_average_cost(transactions)
+            except ZeroDivisionError:
+                result = None
+
+            if result is None or expected is None:
+                matches = result is expected
+            else:
+                matches = math.isclose(result, expected, rel_tol=1e-9)
+
+            if not matches:
+                mismatches += 1
+                if mismatches <= 3:
+                    self.stdout.write(
+                        self.style.ERROR(f"{transactions}: {result} != {expected}")
+                    )
+
+        return mismatches
+
+    def benchmark(self, options):
+        rounds = options["rounds"]
+        self.stdout.write(
+            f"{'txs':>6} {'list rebuild':>14} {'lot rebuild':>13} {'tick':>10}"
+        )
+
+        for count in options["transactions"]:
+            transactions = synthetic_transactions(count, count)
+
+            # The reference modifies its input, every round gets a fresh copy
+            copies = [copy.deepcopy(transactions) for _ in range(rounds)]
+            expected, list_ms = timed(
+                lambda: list_fifo_average_cost(copies.pop()), rounds
+            )
+            rebuilt, rebuild_ms = timed(
+                lambda: calculate_spot_fifo_average_cost(transactions), rounds
+            )
+
+            lots = FifoLots("spot_quantity", "spot_cost_price").extend(
+                transactions[:-1]
+            )
+            state = lots.snapshot()
+
+            def tick():
+                lots.restore(state)
+                lots.apply(transactions[-1])
+                return lots.average_cost()
+
+            incremental, _ = timed(tick, rounds)
+            start = time.perf_counter()
+            for _ in range(1000):
+                lots.average_cost()
+            query_us = (time.perf_counter() - start) * 1000
+
+            for result in (rebuilt, incremental):
+                if not math.isclose(result, expected, rel_tol=1e-9):
+                    self.stdout.write(
+                        self.style.ERROR(f"{count}: {result} != {expected}")
+                    )
+
+            self.stdout.write(
+                f"{count:>6} {list_ms:>11.2f} ms {rebuild_ms:>10.2f} ms "
+                f"{query_us:>7.3f} us"
+            )
+
+        self.stdout.write(
+            "tick: average cost query on the live lots, as the bot ledger does"
+        )
+
+        cases = options["cases"]
+        mismatches = self.check_partial_closes(cases)
+        self.stdout.write(
+            f"partial closes: {cases - mismatches}/{cases} match the exact reference"
+        )
@@ -0,0 +1,237 @@
+import datetime
+import json
+import os
+import re
+import ssl
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ccxt
+
+from crypto.http_transport import (
+    connection_stats,
+    create_http_session,
+    reset_connection_stats,
+)
+from crypto.management.benchmark import BenchmarkCommand, measure, percentile
+
+
+ORDER_BOOK = {
+    "lastUpdateId": 1,
+    "bids": [[str(100 - i * 0.01), "1.5"] for i in range(100)],
+    "asks": [[str(100 + i * 0.01), "1.5"] for i in range(100)],
+}
+
+ACCOUNT = {
+    "makerCommission": 10,
+    "takerCommission": 10,
+    "canTrade": True,
+    "updateTime": 0,
+    "accountType": "SPOT",
+    "balances": [
+        {"asset": "USDT", "free": "1000.0", "locked": "0.0"},
+        {"asset": "BTC", "free": "0.5", "locked": "0.0"},
+    ],
+}
+
+MARKET = {
+    "id": "BTCUSDT",
+    "symbol": "BTC/USDT",
+    "base": "BTC",
+    "quote": "USDT",
+    "baseId": "BTC",
+    "quoteId": "USDT",
+    "type": "spot",
+    "spot": True,
+    "margin": False,
+    "swap": False,
+    "future": False,
+    "option": False,
+    "contract": False,
+    "linear": None,
+    "inverse": None,
+    "active": True,
+    "precision": {},
+    "limits": {},
+    "info": {},
+}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Binance REST stand-in answering depth and account calls over keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if "/depth" in self.path:
+            body = ORDER_BOOK
+        elif "/account" in self.path:
+            body = ACCOUNT
+        else:
+            body = {}
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def create_certificate(directory):
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.utcnow()
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption(),
+            )
+        )
+    return cert_path, key_path
+
+
+def start_stand_in(tls, delay):
+    class Handler(StandInHandler):
+        def do_GET(self):
+            if delay:
+                time.sleep(delay)
+            super().do_GET()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    scheme = "http"
+
+    if tls:
+        directory = tempfile.mkdtemp()
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*create_certificate(directory))
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
+
+
+def point_to(urls, base_url):
+    if isinstance(urls, dict):
+        return {key: point_to(value, base_url) for key, value in urls.items()}
+    if isinstance(urls, str):
+        return re.sub(r"^https?://[^/]+", base_url, urls)
+    return urls
+
+
+def create_client(base_url, session=None):
+    config = {
+        "apiKey": "key",
+        "secret": "secret",
+        "enableRateLimit": False,
+        "options": {"defaultType": "spot"},
+    }
+    if session is not None:
+        config["session"] = session
+
+    exchange = ccxt.binance(config)
+    exchange.verify = False
+    exchange.urls["api"] = point_to(exchange.urls["api"], base_url)
+    exchange.set_markets([MARKET])
+    return exchange
+
+
+class Command(BenchmarkCommand):
+    """Django command to compare per-call latency of fresh ccxt clients and the shared keep-alive session"""
+
+    rounds = 200
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--plain", action="store_true", help="Use HTTP instead of TLS")
+        parser.add_argument(
+            "--delay", type=float, default=0, help="Server side delay in seconds"
+        )
+
+    def timed(self, calls, func):
+        _, durations = measure(func, calls)
+        return statistics.median(durations), percentile(durations, 0.99)
+
+    def benchmark(self, options):
+        import urllib3
+
+        urllib3.disable_warnings()
+
+        calls = options["rounds"]
+        server, base_url = start_stand_in(not options["plain"], options["delay"])
+        self.stdout.write(f"Stand-in listening on {base_url}")
+
+        calls_by_name = {
+            "fetch_order_book": lambda exchange: exchange.fetch_order_book("BTC/USDT"),
+            "fetch_balance": lambda exchange: exchange.fetch_balance(),
+        }
+
+        self.stdout.write(
+            f"{'call':>18} {'mode':>14} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'requests':>9} {'new conns':>10} {'reused':>7}"
+        )
+        for name, call in calls_by_name.items():
+            reset_connection_stats()
+            self.report(
+                name,
+                "fresh client",
+                self.timed(
+                    calls,
+                    lambda: call(create_client(base_url, create_http_session())),
+                ),
+            )
+
+            reset_connection_stats()
+            client = create_client(base_url)
+
+            def new_connection():
+                client.session = create_http_session()
+                call(client)
+
+            self.report(name, "new connection", self.timed(calls, new_connection))
+
+            reset_connection_stats()
+            shared = create_client(base_url, create_http_session())
+            call(shared)
+            self.report(name, "shared session", self.timed(calls, lambda: call(shared)))
+
+        server.shutdown()
+
+    def report(self, name, mode, timings):
+        stats = connection_stats().get("127.0.0.1", {})
+        self.stdout.write(
+            f"{name:>18} {mode:>14} {timings[0]:>8.2f} {timings[1]:>8.2f} "
+            f"{stats.get('requests', 0):>9} {stats.get('new_connections', 0):>10} "
+            f"{stats.get('reused', 0):>7}"
+        )
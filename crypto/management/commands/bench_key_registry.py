@@ -0,0 +1,102 @@
+import statistics
+import threading
+import time
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from crypto.key_registry import register_key, live_keys
+from crypto.management.benchmark import BenchmarkCommand
+
+
+BENCH_PREFIX = "bench_keyspace"
+BENCH_REGISTRY = "bench_registry_price_keys"
+PRICE_KEY_COUNT = 16
+
+
+class Command(BenchmarkCommand):
+    """Django command to compare KEYS scans with the key registry as the keyspace grows"""
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1000, 10000, 100000, 500000],
+            help="Keyspace sizes to measure",
+        )
+
+    def fill_keyspace(self, connection, start, end):
+        pipeline = connection.pipeline(transaction=False)
+        for i in range(start, end):
+            pipeline.set(f"{BENCH_PREFIX}:filler:{i}", 1, ex=600)
+            if i % 10000 == 0:
+                pipeline.execute()
+        pipeline.execute()
+
+    def clear_keyspace(self, connection):
+        for key in connection.scan_iter(f"*{BENCH_PREFIX}*", count=10000):
+            connection.delete(key)
+        connection.delete(cache.make_key(BENCH_REGISTRY))
+
+    def probe_latency(self, connection, stop, samples):
+        while not stop.is_set():
+            start = time.perf_counter()
+            connection.ping()
+            samples.append((time.perf_counter() - start) * 1000)
+
+    def measure(self, connection, read, rounds):
+        durations = []
+        samples = []
+        stop = threading.Event()
+        prober = threading.Thread(
+            target=self.probe_latency, args=(connection, stop, samples)
+        )
+        prober.start()
+
+        for _ in range(rounds):
+            start = time.perf_counter()
+            keys = read()
+            durations.append((time.perf_counter() - start) * 1000)
+
+        stop.set()
+        prober.join()
+
+        return {
+            "keys": len(keys),
+            "read_ms": statistics.median(durations),
+            "ping_p50_ms": statistics.median(samples) if samples else 0,
+            "ping_max_ms": max(samples) if samples else 0,
+        }
+
+    def benchmark(self, options):
+        connection = get_redis_connection("default")
+        self.clear_keyspace(connection)
+
+        for i in range(PRICE_KEY_COUNT):
+            key = f"{BENCH_PREFIX}_{i}_spot_prices"
+            cache.set(key, {}, 600)
+            register_key(BENCH_REGISTRY, key, 600)
+
+        self.stdout.write(
+            f"{'keyspace':>10} {'reader':>10} {'keys':>6} {'read ms':>10} {'ping p50':>10} {'ping max':>10}"
+        )
+
+        filled = 0
+        for size in sorted(options["sizes"]):
+            self.fill_keyspace(connection, filled, size)
+            filled = size
+
+            readers = {
+                "KEYS": lambda: cache.keys(f"{BENCH_PREFIX}*prices"),
+                "registry": lambda: live_keys(BENCH_REGISTRY),
+            }
+            for name, read in readers.items():
+                result = self.measure(connection, read, options["rounds"])
+                self.stdout.write(
+                    f"{size:>10} {name:>10} {result['keys']:>6} {result['read_ms']:>10.2f} "
+                    f"{result['ping_p50_ms']:>10.2f} {result['ping_max_ms']:>10.2f}"
+                )
+
+        self.clear_keyspace(connection)
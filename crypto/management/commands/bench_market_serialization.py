@@ -0,0 +1,91 @@
+from importlib import import_module
+
+import ccxt
+
+from crypto.market_cache import market_cache
+from crypto.tasks import exchanges
+from crypto.management.benchmark import BenchmarkCommand, timed
+
+
+SERIALIZERS = {
+    "pickle": "django_redis.serializers.pickle.PickleSerializer",
+    "msgpack": "crypto.serializers.MsgpackSerializer",
+    "orjson": "crypto.serializers.OrjsonSerializer",
+}
+
+COMPRESSORS = {
+    "none": "django_redis.compressors.identity.IdentityCompressor",
+    "zlib": "django_redis.compressors.zlib.ZlibCompressor",
+    "zstd": "django_redis.compressors.zstd.ZStdCompressor",
+    "lz4": "django_redis.compressors.lz4.Lz4Compressor",
+}
+
+
+def load_class(path):
+    module_path, class_name = path.rsplit(".", 1)
+    return getattr(import_module(module_path), class_name)
+
+
+class Command(BenchmarkCommand):
+    """Django command to compare market cache payload formats on live market data"""
+
+    def load_payloads(self):
+        payloads = {}
+
+        for _type in ["spot", "swap", "future"]:
+            value = market_cache.get(_type)
+            if value is None:
+                self.stdout.write(self.style.WARNING(f"{_type} is not cached, skipped"))
+                continue
+            payloads[_type] = value
+
+        for exchange_id in exchanges:
+            markets = market_cache.get(f"{exchange_id}_markets")
+            if markets is None:
+                self.stdout.write(f"{exchange_id}_markets is not cached, loading...")
+                try:
+                    markets = getattr(ccxt, exchange_id)().load_markets()
+                except Exception as ex:
+                    self.stdout.write(self.style.WARNING(f"{exchange_id}: {ex}"))
+                    continue
+            payloads[f"{exchange_id}_markets"] = markets
+
+        return payloads
+
+    def benchmark(self, options):
+        rounds = options["rounds"]
+        payloads = self.load_payloads()
+
+        formats = []
+        for serializer_name, serializer_path in SERIALIZERS.items():
+            for compressor_name, compressor_path in COMPRESSORS.items():
+                try:
+                    serializer = load_class(serializer_path)(options={})
+                    compressor = load_class(compressor_path)(options={})
+                except ImportError as ex:
+                    self.stdout.write(
+                        self.style.WARNING(f"{serializer_name}+{compressor_name}: {ex}")
+                    )
+                    continue
+                formats.append((f"{serializer_name}+{compressor_name}", serializer, compressor))
+
+        self.stdout.write(
+            f"{'key':>18} {'format':>16} {'size KB':>10} {'encode ms':>10} {'decode ms':>10}"
+        )
+        for key, value in payloads.items():
+            for name, serializer, compressor in formats:
+                try:
+                    encoded, encode_ms = timed(
+                        lambda: compressor.compress(serializer.dumps(value)), rounds
+                    )
+                    _, decode_ms = timed(
+                        lambda: serializer.loads(compressor.decompress(encoded)), rounds
+                    )
+                except Exception as ex:
+                    self.stdout.write(self.style.WARNING(f"{key} {name}: {ex}"))
+                    continue
+
+                self.stdout.write(
+                    f"{key:>18} {name:>16} {len(encoded) / 1024:>10.1f} "
+                    f"{encode_ms:>10.2f} {decode_ms:>10.2f}"
+                )
@@ -0,0 +1,141 @@
+import random
+
+from crypto.columnar import build_columnar_snapshot
+from crypto.scanner import build_join_index, scan_spot_perp
+from crypto.management.benchmark import BenchmarkCommand, timed
+
+
+EXCHANGES = ["binance", "okx", "gate", "mexc", "bitmart", "kucoin"]
+
+
+def ticker(symbol, base, quote, exchange, price, rng):
+    spread = price * rng.uniform(0.0001, 0.002)
+    return {
+        "symbol": symbol,
+        "base": base,
+        "quote": quote,
+        "exchange": exchange,
+        "bid": price - spread if rng.random() > 0.02 else None,
+        "ask": price + spread,
+        "last": price,
+        "quoteVolume": rng.uniform(0, 1000000),
+    }
+
+
+def synthetic_market(symbols, seed):
+    rng = random.Random(seed)
+    spot = {}
+    swap = {}
+
+    for i in range(symbols):
+        base = f"C{i}"
+        quote = "USDT" if rng.random() > 0.1 else "BTC"
+        price = rng.uniform(0.001, 1000)
+        spot_symbol = f"{base}/{quote}"
+        swap_symbol = f"{spot_symbol}:{quote}"
+
+        spot[spot_symbol] = {
+            "symbol": spot_symbol,
+            "quote": quote,
+            "exchanges": {
+                exchange: ticker(spot_symbol, base, quote, exchange, price, rng)
+                for exchange in rng.sample(EXCHANGES, rng.randint(1, len(EXCHANGES)))
+            },
+        }
+        if rng.random() > 0.4:
+            swap[swap_symbol] = {
+                "symbol": swap_symbol,
+                "quote": quote,
+                "exchanges": {
+                    exchange: ticker(
+                        swap_symbol,
+                        base,
+                        quote,
+                        exchange,
+                        price * rng.uniform(0.995, 1.01),
+                        rng,
+                    )
+                    for exchange in rng.sample(EXCHANGES, rng.randint(1, 4))
+                },
+            }
+
+    return spot, swap
+
+
+def nested_loop_scan(spot, swap, min_rate, max_rate, min_volume):
+    """The per-coin loop the scanner replaced, kept as the reference"""
+    arbitrages = []
+
+    for coin in spot.values():
+        if coin["quote"] != "USDT":
+            continue
+
+        hedge_symbol = f"{coin['symbol']}:USDT"
+        if hedge_symbol not in swap:
+            continue
+
+        for from_exchange, from_values in coin["exchanges"].items():
+            if from_values["quoteVolume"] < min_volume:
+                continue
+
+            for hedge_exchange, hedge_values in swap[hedge_symbol]["exchanges"].items():
+                if hedge_values["quoteVolume"] < min_volume:
+                    continue
+
+                try:
+                    sell_price = hedge_values["bid"] or hedge_values["last"]
+                    profit_rate = (sell_price / from_values["ask"]) - 1
+                except:
+                    continue
+
+                if min_rate < profit_rate < max_rate:
+                    arbitrages.append(
+                        (coin["symbol"], from_exchange, hedge_symbol, hedge_exchange)
+                    )
+
+    return arbitrages
+
+
+class Command(BenchmarkCommand):
+    """Django command to compare the vectorized spot-perp scanner with the nested loops"""
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[1000, 3000, 10000]
+        )
+        parser.add_argument("--min-volume", type=float, default=100000)
+
+    def benchmark(self, options):
+        rounds = options["rounds"]
+        min_volume = options["min_volume"]
+
+        self.stdout.write(
+            f"{'symbols':>8} {'pairs':>8} {'found':>6} {'loop ms':>9} "
+            f"{'index ms':>9} {'scan ms':>9} {'speedup':>8}"
+        )
+        for size in options["sizes"]:
+            spot, swap = synthetic_market(size, size)
+            spot_columnar = build_columnar_snapshot(spot)
+            swap_columnar = build_columnar_snapshot(swap)
+
+            expected, loop_ms = timed(
+                lambda: nested_loop_scan(spot, swap, 0.008, 0.05, min_volume), rounds
+            )
+            (left, _), index_ms = timed(
+                lambda: build_join_index(spot_columnar, swap_columnar), rounds
+            )
+            found, scan_ms = timed(
+                lambda: scan_spot_perp(
+                    spot_columnar, swap_columnar, 0.008, 0.05, min_volume=min_volume
+                ),
+                rounds,
+            )
+
+            if sorted(expected) != sorted(candidate[:4] for candidate in found):
+                self.stdout.write(self.style.ERROR(f"{size}: results differ"))
+
+            self.stdout.write(
+                f"{size:>8} {len(left):>8} {len(found):>6} {loop_ms:>9.2f} "
+                f"{index_ms:>9.2f} {scan_ms:>9.2f} {loop_ms / scan_ms:>7.1f}x"
+            )
@@ -0,0 +1,92 @@
+import random
+
+from crypto.columnar import build_columnar_snapshot
+from crypto.spreads import SPREAD_MAX_RATE, top_spreads
+from crypto.management.benchmark import BenchmarkCommand, timed
+
+
+EXCHANGES = ["binance", "okx", "gate", "mexc", "bitmart", "kucoin"]
+
+
+def synthetic_spot(symbols, exchanges, seed):
+    rng = random.Random(seed)
+    spot = {}
+
+    for i in range(symbols):
+        symbol = f"C{i}/USDT"
+        price = rng.uniform(0.001, 1000)
+        listed = rng.sample(exchanges, rng.randint(1, len(exchanges)))
+
+        spot[symbol] = {
+            "symbol": symbol,
+            "exchanges": {
+                exchange: {
+                    "symbol": symbol,
+                    "exchange": exchange,
+                    "bid": price * rng.uniform(0.99, 1.005),
+                    "ask": price * rng.uniform(1.0, 1.01),
+                    "last": price,
+                    "quoteVolume": rng.uniform(0, 1000000),
+                }
+                for exchange in listed
+            },
+        }
+
+    return spot
+
+
+def dict_loop_spreads(spot, k):
+    """Exchange pair x symbol loops over the market dict, kept as the reference"""
+    spreads = []
+
+    for symbol, coin in spot.items():
+        for buy_exchange, buy_values in coin["exchanges"].items():
+            for sell_exchange, sell_values in coin["exchanges"].items():
+                if buy_exchange == sell_exchange:
+                    continue
+
+                try:
+                    rate = sell_values["bid"] / buy_values["ask"] - 1
+                except:
+                    continue
+
+                if rate < SPREAD_MAX_RATE:
+                    spreads.append((rate, symbol, buy_exchange, sell_exchange))
+
+    spreads.sort(reverse=True)
+    return spreads[:k]
+
+
+class Command(BenchmarkCommand):
+    """Django command to time the spot spread matrix against per-coin dict loops"""
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--symbols", type=int, default=3000)
+        parser.add_argument("--exchanges", type=int, default=6)
+        parser.add_argument("--top", type=int, default=200)
+
+    def benchmark(self, options):
+        rounds = options["rounds"]
+        k = options["top"]
+        exchanges = (EXCHANGES * options["exchanges"])[: options["exchanges"]]
+        exchanges = [f"{exchange}{i}" for i, exchange in enumerate(exchanges)]
+
+        spot = synthetic_spot(options["symbols"], exchanges, options["symbols"])
+        snapshot, columnar_ms = timed(lambda: build_columnar_snapshot(spot), 1)
+
+        expected, loop_ms = timed(lambda: dict_loop_spreads(spot, k), rounds)
+        spreads, matrix_ms = timed(lambda: top_spreads(snapshot, k), rounds)
+
+        found = [
+            (s["symbol"], s["buy_exchange"], s["sell_exchange"]) for s in spreads
+        ]
+        if found != [(e[1], e[2], e[3]) for e in expected]:
+            self.stdout.write(self.style.ERROR("Top spreads differ from the dict loops"))
+
+        self.stdout.write(
+            f"{options['symbols']} symbols x {len(exchanges)} exchanges, top {k}\n"
+            f"dict loops:   {loop_ms:>8.2f} ms\n"
+            f"matrix:       {matrix_ms:>8.2f} ms ({loop_ms / matrix_ms:.1f}x)\n"
+            f"columnar build (done once by create_data): {columnar_ms:.2f} ms"
+        )
@@ -0,0 +1,41 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crypto.streaming import STREAMS, run_ticker_streams
+
+
+def parse_pair(value):
+    exchange_id, _type = value.split(":")
+    if (exchange_id, _type) not in STREAMS:
+        raise CommandError(f"No stream defined for {value}")
+
+    return exchange_id, _type
+
+
+class Command(BaseCommand):
+    """Django command to stream exchange tickers into the price cache"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pair",
+            action="append",
+            default=[],
+            help="exchange:type to stream, all defined streams by default",
+        )
+        parser.add_argument(
+            "--url",
+            action="append",
+            default=[],
+            help="exchange:type=ws://... to override a stream url",
+        )
+
+    def handle(self, *args, **options):
+        pairs = [parse_pair(pair) for pair in options["pair"]] or None
+        urls = {}
+        for override in options["url"]:
+            pair, url = override.split("=", 1)
+            urls[parse_pair(pair)] = url
+
+        self.stdout.write(f"Streaming {pairs or list(STREAMS)}")
+        asyncio.run(run_ticker_streams(pairs, urls))
@@ -0,0 +1,54 @@
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from django_redis import get_redis_connection
+
+
+# Market snapshots and exchange metadata, stored with the serializer and
+# compressor configured for the "market" cache instead of pickle
+market_cache = ConnectionProxy(caches, "market")
+
+
+def symbols_key(_type):
+    return market_cache.make_key(f"{_type}_symbols")
+
+
+def set_symbol_entries(_type, _dict, tickers, full=False, timeout=300):
+    """Writes the given tickers of a market dict into the {type}_symbols hash
+
+    Tickers missing from the dict are removed from the hash, a full write
+    replaces the whole hash.
+    """
+    connection = get_redis_connection("market")
+    key = symbols_key(_type)
+    entries = {
+        ticker: market_cache.client.encode(_dict[ticker])
+        for ticker in tickers
+        if ticker in _dict
+    }
+    removed = [ticker for ticker in tickers if ticker not in _dict]
+
+    pipeline = connection.pipeline()
+    if full:
+        pipeline.delete(key)
+    elif removed:
+        pipeline.hdel(key, *removed)
+    if entries:
+        pipeline.hset(key, mapping=entries)
+    pipeline.expire(key, timeout)
+    pipeline.execute()
+
+
+def get_symbol_entries(_type, tickers):
+    """Reads only the requested tickers of a market dict with one HMGET"""
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+
+    connection = get_redis_connection("market")
+    values = connection.hmget(symbols_key(_type), tickers)
+
+    return {
+        ticker: market_cache.client.decode(value)
+        for ticker, value in zip(tickers, values)
+        if value is not None
+    }
@@ -0,0 +1,94 @@
+import hashlib
+import time
+
+import orjson
+
+from crypto.market_cache import market_cache
+
+
+def fingerprint(value):
+    dumped = orjson.dumps(
+        value, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str
+    )
+    return hashlib.sha1(dumped).hexdigest()
+
+
+def diff_fingerprints(previous, current):
+    return {
+        "added": [symbol for symbol in current if symbol not in previous],
+        "removed": [symbol for symbol in previous if symbol not in current],
+        "changed": [
+            symbol
+            for symbol, digest in current.items()
+            if symbol in previous and previous[symbol] != digest
+        ],
+    }
+
+
+def get_markets_version(exchange_id):
+    return market_cache.get(f"{exchange_id}_markets_version")
+
+
+def get_markets_diff(exchange_id):
+    return market_cache.get(f"{exchange_id}_markets_diff")
+
+
+def store_exchange_markets(exchange_id, markets, currencies, markets_by_id, timeout):
+    """Writes exchange metadata only when its fingerprint changed
+
+    Returns the per-symbol diff that was published, or None when nothing changed.
+    """
+    data = {
+        f"{exchange_id}_markets": markets,
+        f"{exchange_id}_currencies": currencies,
+        f"{exchange_id}_markets_by_id": markets_by_id,
+    }
+    meta_keys = [
+        f"{exchange_id}_markets_fingerprint",
+        f"{exchange_id}_markets_version",
+        f"{exchange_id}_markets_diff",
+    ]
+
+    fingerprints = {symbol: fingerprint(market) for symbol, market in markets.items()}
+    currencies_fingerprint = fingerprint(currencies)
+    previous = market_cache.get(f"{exchange_id}_markets_fingerprint")
+
+    if (
+        previous
+        and previous["markets"] == fingerprints
+        and previous["currencies"] == currencies_fingerprint
+        and all([market_cache.touch(key, timeout) for key in data])
+    ):
+        for key in meta_keys:
+            market_cache.touch(key, timeout)
+        return None
+
+    version = time.time_ns()
+    if previous:
+        diff = diff_fingerprints(previous["markets"], fingerprints)
+        diff["previous_version"] = previous["version"]
+        diff["currencies"] = previous["currencies"] != currencies_fingerprint
+    else:
+        diff = {"added": [], "removed": [], "changed": [], "full": True}
+        diff["previous_version"] = None
+        diff["currencies"] = True
+    diff["version"] = version
+    diff["markets"] = {
+        symbol: markets[symbol] for symbol in diff["added"] + diff["changed"]
+    }
+
+    for key, value in data.items():
+        market_cache.set(key, value, timeout)
+    market_cache.set(
+        f"{exchange_id}_markets_fingerprint",
+        {
+            "markets": fingerprints,
+            "currencies": currencies_fingerprint,
+            "version": version,
+        },
+        timeout,
+    )
+    market_cache.set(f"{exchange_id}_markets_diff", diff, timeout)
+    market_cache.set(f"{exchange_id}_markets_version", version, timeout)
+
+    return diff
@@ -0,0 +1,156 @@
+import time
+from django.core.cache import cache
+
+from crypto.events import publish_price_changes
+from crypto.market_cache import market_cache
+from crypto.key_registry import PRICE_KEYS, register_key
+from crypto.market_metadata import get_markets_version
+from crypto.setup_functions import (
+    create_empty_exchange_dict,
+    insert_exchange_market_details,
+    insert_exchange_currency_details,
+    insert_exchange_price_details,
+    find_best_exchange,
+    insert_common_details,
+)
+
+
+MARKET_TYPES = ["spot", "swap", "future"]
+
+
+def set_exchange_prices(exchange_id, _type, prices, timeout=300):
+    key = f"{exchange_id}_{_type}_prices"
+    cache.set(key, prices, timeout)
+    cache.set(f"{key}_version", time.time_ns(), timeout)
+    register_key(PRICE_KEYS, key, timeout)
+    publish_price_changes(exchange_id, _type, prices, timeout)
+
+
+def set_snapshot_version(_type, timeout=300):
+    market_cache.set(f"{_type}_version", time.time_ns(), timeout)
+
+
+def get_snapshot_version(_type):
+    return market_cache.get(f"{_type}_version")
+
+
+class MarketStateBuilder:
+    """Keeps spot/swap/future dicts in memory and re-merges only changed price keys"""
+
+    def __init__(self):
+        self.markets = {_type: {} for _type in MARKET_TYPES}
+        self.slices = {}
+        self.versions = {}
+
+    def build_slice(self, exchange_id, _type, prices):
+        markets = market_cache.get(f"{exchange_id}_markets")
+        _dict = {}
+
+        create_empty_exchange_dict(prices, _dict, exchange_id)
+        insert_exchange_market_details(markets, _dict, exchange_id)
+        if _type == "spot":
+            currencies = market_cache.get(f"{exchange_id}_currencies")
+            insert_exchange_currency_details(currencies, _dict, exchange_id)
+        insert_exchange_price_details(prices, _dict, exchange_id)
+
+        return {
+            ticker: values["exchanges"][exchange_id]
+            for ticker, values in _dict.items()
+            if exchange_id in values["exchanges"]
+        }
+
+    def replace_slice(self, exchange_id, _type, new_slice, touched):
+        market = self.markets[_type]
+        old_slice = self.slices.pop((exchange_id, _type), {})
+
+        for ticker in old_slice:
+            if ticker not in new_slice and ticker in market:
+                market[ticker]["exchanges"].pop(exchange_id, None)
+                touched.add(ticker)
+
+        for ticker, exc_dict in new_slice.items():
+            if ticker not in market:
+                market[ticker] = {"exchanges": {}}
+            market[ticker]["exchanges"][exchange_id] = exc_dict
+            touched.add(ticker)
+
+        if new_slice:
+            self.slices[(exchange_id, _type)] = new_slice
+
+    def refresh_tickers(self, _type, tickers, exchange_order):
+        market = self.markets[_type]
+        refreshed = {}
+
+        for ticker in tickers:
+            values = market.get(ticker)
+            if values is None:
+                continue
+
+            if len(values["exchanges"]) == 0:
+                del market[ticker]
+                continue
+
+            # Common fields are rebuilt from scratch, a ticker whose best exchange
+            # or details fail keeps none of its previous price and volume
+            exchanges = values["exchanges"]
+            values = market[ticker] = {
+                "exchanges": {
+                    exc: exchanges[exc] for exc in exchange_order if exc in exchanges
+                }
+            }
+
+            try:
+                values["exchange"] = find_best_exchange(values["exchanges"])
+            except:
+                values["exchange"] = None
+                continue
+
+            refreshed[ticker] = values
+
+        insert_common_details(refreshed)
+
+    def update(self, market_names):
+        touched = {_type: set() for _type in MARKET_TYPES}
+        exchange_order = {_type: [] for _type in MARKET_TYPES}
+        live = set()
+
+        for market_name in market_names:
+            exchange_id = market_name.split("_")[0]
+            _type = market_name.split("_")[1]
+            if _type not in self.markets:
+                continue
+
+            exchange_order[_type].append(exchange_id)
+            prices_version = cache.get(f"{market_name}_version")
+            version = (prices_version, get_markets_version(exchange_id))
+            if prices_version is not None and self.versions.get(market_name) == version:
+                live.add((exchange_id, _type))
+                continue
+
+            prices = cache.get(market_name)
+            if prices is None:
+                continue
+
+            live.add((exchange_id, _type))
+            new_slice = self.build_slice(exchange_id, _type, prices)
+            self.replace_slice(exchange_id, _type, new_slice, touched[_type])
+            self.versions[market_name] = version
+
+        for exchange_id, _type in list(self.slices):
+            if (exchange_id, _type) in live:
+                continue
+
+            self.replace_slice(exchange_id, _type, {}, touched[_type])
+            self.versions.pop(f"{exchange_id}_{_type}_prices", None)
+
+        for _type, tickers in touched.items():
+            self.refresh_tickers(_type, tickers, exchange_order[_type])
+
+        return touched
+
+    def snapshot(self, _type):
+        return {
+            key: value
+            for key, value in self.markets[_type].items()
+            if value.get("type") == _type and len(value.get("exchanges")) > 0
+        }
@@ -0,0 +1,146 @@
+import logging
+import time
+import traceback
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from crypto.http_transport import get_http_session
+
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_QUEUE = "notification_queue"
+FLUSH_LOCK = "notification_flush_lock"
+FLUSH_LOCK_TIMEOUT = 120
+# Messages taken from the queue per flush and joined up to Telegram's text limit
+NOTIFICATION_BATCH = 100
+MESSAGE_LIMIT = 4096
+# Group chats accept about 20 messages a minute
+SEND_INTERVAL = 3
+SEND_TIMEOUT = 10
+SEND_RETRIES = 3
+RETRY_BACKOFF = 1
+MAX_RETRY_DELAY = 10
+
+
+def notify(message, dedup_key=None, dedup_ttl=300):
+    """Queues a message for the sender task, dropping repeats of dedup_key for
+    dedup_ttl seconds. Never blocks on or raises from Telegram.
+    """
+    try:
+        if dedup_key is not None and not cache.add(
+            f"notified_{dedup_key}", 1, dedup_ttl
+        ):
+            return False
+
+        connection = get_redis_connection("default")
+        connection.rpush(cache.make_key(NOTIFICATION_QUEUE), message)
+        return True
+    except:
+        logger.error(traceback.format_exc())
+        return False
+
+
+def pop_messages(connection, count):
+    key = cache.make_key(NOTIFICATION_QUEUE)
+    pipeline = connection.pipeline()
+    pipeline.lrange(key, 0, count - 1)
+    pipeline.ltrim(key, count, -1)
+    messages, _ = pipeline.execute()
+    return [message.decode() for message in messages]
+
+
+def requeue_messages(connection, messages):
+    """Puts unsent messages back at the head of the queue, keeping their order"""
+    if messages:
+        connection.lpush(cache.make_key(NOTIFICATION_QUEUE), *reversed(messages))
+
+
+def batch_messages(messages, limit=MESSAGE_LIMIT):
+    """Groups messages so each group joined by newlines fits in one Telegram text"""
+    batches = []
+    batch, length = [], 0
+
+    for message in messages:
+        message = message[:limit]
+        if batch and length + 1 + len(message) > limit:
+            batches.append(batch)
+            batch, length = [], 0
+
+        length += len(message) + (1 if batch else 0)
+        batch.append(message)
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def retry_delay(response, attempt):
+    if response is not None and response.status_code == 429:
+        try:
+            return response.json()["parameters"]["retry_after"]
+        except:
+            pass
+    return RETRY_BACKOFF * 2**attempt
+
+
+def send_message(session, text):
+    """Returns False when Telegram stayed unavailable after the retries"""
+    url = f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+    data = {
+        "chat_id": settings.TELEGRAM_CHAT_ID,
+        "parse_mode": "Markdown",
+        "text": text,
+    }
+
+    for attempt in range(SEND_RETRIES):
+        response = None
+        try:
+            response = session.post(url, data=data, timeout=SEND_TIMEOUT)
+            if response.status_code != 429 and response.status_code < 500:
+                if response.status_code != 200:
+                    # Rejected messages fail the same way on every retry
+                    logger.error(f"Telegram rejected a message: {response.text}")
+                return True
+        except requests.RequestException:
+            logger.warning(traceback.format_exc())
+
+        delay = retry_delay(response, attempt)
+        if attempt == SEND_RETRIES - 1 or delay > MAX_RETRY_DELAY:
+            break
+        time.sleep(delay)
+
+    return False
+
+
+def flush_notifications(count=NOTIFICATION_BATCH):
+    """Sends queued messages in batches, paced to the Telegram rate limit.
+    Returns the number of messages delivered.
+    """
+    if not cache.add(FLUSH_LOCK, 1, FLUSH_LOCK_TIMEOUT):
+        return 0
+
+    try:
+        connection = get_redis_connection("default")
+        messages = pop_messages(connection, count)
+        batches = batch_messages(messages)
+        session = get_http_session()
+        sent = 0
+
+        for i, batch in enumerate(batches):
+            if i > 0:
+                time.sleep(SEND_INTERVAL)
+
+            if not send_message(session, "\n".join(batch)):
+                requeue_messages(
+                    connection, [m for remaining in batches[i:] for m in remaining]
+                )
+                break
+            sent += len(batch)
+
+        return sent
+    finally:
+        cache.delete(FLUSH_LOCK)
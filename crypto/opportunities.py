@@ -0,0 +1,117 @@
+import time
+
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+
+from crypto.events import publish_event
+from crypto.market_cache import market_cache
+
+
+# Opportunity ids by profit rate, by expiry timestamp, their payloads and the
+# key of the exchange pair index each id is in
+PROFIT_INDEX = "opportunities_by_profit"
+EXPIRY_INDEX = "opportunities_by_expiry"
+PAYLOADS = "opportunities"
+PAIR_KEYS = "opportunities_pair_keys"
+
+
+def index_key(name):
+    return market_cache.make_key(name)
+
+
+def pair_index_key(from_exchange, to_exchange):
+    return market_cache.make_key(f"opportunities_{from_exchange}_{to_exchange}")
+
+
+def opportunity_id(symbol, from_exchange, to_exchange):
+    return f"{symbol}-{from_exchange}-{to_exchange}"
+
+
+def add_opportunity(symbol, from_exchange, to_exchange, payload, profit_rate, timeout):
+    """Indexes an opportunity by profit rate and exchange pair for timeout seconds"""
+    connection = get_redis_connection("market")
+    _id = opportunity_id(symbol, from_exchange, to_exchange)
+    pair_key = pair_index_key(from_exchange, to_exchange)
+
+    pipeline = connection.pipeline()
+    pipeline.hset(index_key(PAYLOADS), _id, market_cache.client.encode(payload))
+    pipeline.hset(index_key(PAIR_KEYS), _id, pair_key)
+    pipeline.zadd(index_key(PROFIT_INDEX), {_id: profit_rate})
+    pipeline.zadd(index_key(EXPIRY_INDEX), {_id: time.time() + timeout})
+    pipeline.zadd(pair_key, {_id: profit_rate})
+    for key in (PAYLOADS, PAIR_KEYS, PROFIT_INDEX, EXPIRY_INDEX):
+        pipeline.expire(index_key(key), timeout)
+    pipeline.expire(pair_key, timeout)
+    pipeline.execute()
+
+    publish_event("opportunity", {"id": _id, "profit_rate": profit_rate, **payload})
+
+
+def prune_opportunities(connection):
+    """Drops expired opportunities from every index, one round trip if none expired
+
+    The removal runs in a transaction watching the expiry index, an opportunity
+    stored again meanwhile restarts it instead of being dropped.
+    """
+    expiry_key = index_key(EXPIRY_INDEX)
+    if not connection.zrangebyscore(expiry_key, "-inf", time.time(), start=0, num=1):
+        return 0
+
+    with connection.pipeline() as pipeline:
+        while True:
+            try:
+                pipeline.watch(expiry_key)
+                expired = pipeline.zrangebyscore(expiry_key, "-inf", time.time())
+                if not expired:
+                    return 0
+                pair_keys = pipeline.hmget(index_key(PAIR_KEYS), expired)
+
+                pipeline.multi()
+                pipeline.zrem(expiry_key, *expired)
+                pipeline.zrem(index_key(PROFIT_INDEX), *expired)
+                pipeline.hdel(index_key(PAYLOADS), *expired)
+                pipeline.hdel(index_key(PAIR_KEYS), *expired)
+                for _id, pair_key in zip(expired, pair_keys):
+                    if pair_key is not None:
+                        pipeline.zrem(pair_key, _id)
+                pipeline.execute()
+
+                return len(expired)
+            except WatchError:
+                continue
+
+
+def get_opportunities(limit=None, offset=0, from_exchange=None, to_exchange=None):
+    """Returns (opportunities, total) best first, optionally for one exchange pair
+
+    Opportunities are indexed per pair only, filtering on a single exchange
+    raises ValueError.
+    """
+    if bool(from_exchange) != bool(to_exchange):
+        raise ValueError("from_exchange and to_exchange are filtered together")
+
+    connection = get_redis_connection("market")
+    prune_opportunities(connection)
+
+    if from_exchange and to_exchange:
+        index = pair_index_key(from_exchange, to_exchange)
+    else:
+        index = index_key(PROFIT_INDEX)
+
+    end = -1 if limit is None else offset + limit - 1
+    pipeline = connection.pipeline()
+    pipeline.zrevrange(index, offset, end)
+    pipeline.zcard(index)
+    ids, total = pipeline.execute()
+
+    if not ids:
+        return [], total
+
+    payloads = connection.hmget(index_key(PAYLOADS), ids)
+    opportunities = [
+        market_cache.client.decode(payload)
+        for payload in payloads
+        if payload is not None
+    ]
+
+    return opportunities, total
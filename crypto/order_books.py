@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from crypto.market_cache import market_cache
+
+
+# Seconds a book stays readable in Redis, freshness is checked on fetched_at
+BOOK_TIMEOUT = 5
+# Seconds a cross-process fetch lock is held at most
+LOCK_TIMEOUT = 3
+POLL_INTERVAL = 0.02
+
+_lock = threading.Lock()
+_flights = {}
+_stats = defaultdict(int)
+
+
+def record(counter):
+    with _lock:
+        _stats[counter] += 1
+
+
+def order_book_stats():
+    """hits: fresh book in Redis, coalesced: joined an in-flight fetch of this
+    process, shared: waited for another process's fetch, misses: exchange calls
+    """
+    with _lock:
+        stats = dict(_stats)
+
+    served = sum(stats.get(c, 0) for c in ("hits", "coalesced", "shared", "misses"))
+    stats["hit_rate"] = 1 - stats.get("misses", 0) / served if served else 0
+    return stats
+
+
+def reset_order_book_stats():
+    with _lock:
+        _stats.clear()
+
+
+def freshness_window():
+    return getattr(settings, "ORDER_BOOK_FRESHNESS_MS", 300) / 1000
+
+
+def book_key(exchange_id, symbol, limit):
+    return f"order_book_{exchange_id}_{symbol}_{limit}"
+
+
+def read_fresh(key, freshness):
+    entry = market_cache.get(key)
+    if entry is not None and time.time() - entry["fetched_at"] <= freshness:
+        return entry["book"]
+
+    return None
+
+
+def store_book(key, book):
+    market_cache.set(key, {"fetched_at": time.time(), "book": book}, BOOK_TIMEOUT)
+    return book
+
+
+class Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.book = None
+        self.error = None
+
+
+def fetch_shared(exchange, symbol, limit, key, freshness):
+    """Fetches from the exchange, or waits for the process holding the Redis lock"""
+    lock_key = f"{key}_lock"
+    acquired = market_cache.add(lock_key, True, LOCK_TIMEOUT)
+
+    if not acquired:
+        deadline = time.time() + LOCK_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            book = read_fresh(key, freshness)
+            if book is not None:
+                record("shared")
+                return book
+            if market_cache.get(lock_key) is None:
+                break
+
+    try:
+        book = exchange.fetch_order_book(symbol, limit)
+        record("misses")
+        return store_book(key, book)
+    finally:
+        if acquired:
+            market_cache.delete(lock_key)
+
+
+def get_order_book(exchange, symbol, limit=20, freshness=None):
+    """Returns the order book of symbol, no older than the freshness window
+
+    Concurrent requests for the same book in this process share one fetch, and
+    other processes reuse it through Redis.
+    """
+    freshness = freshness_window() if freshness is None else freshness
+    key = book_key(exchange.id, symbol, limit)
+
+    book = read_fresh(key, freshness)
+    if book is not None:
+        record("hits")
+        return book
+
+    with _lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Flight()
+
+    if not leader:
+        flight.event.wait(LOCK_TIMEOUT * 2)
+        if flight.error is not None:
+            raise flight.error
+        if flight.book is not None:
+            record("coalesced")
+            return flight.book
+
+        return get_order_book(exchange, symbol, limit, freshness)
+
+    try:
+        flight.book = fetch_shared(exchange, symbol, limit, key, freshness)
+        return flight.book
+    except Exception as ex:
+        flight.error = ex
+        raise
+    finally:
+        with _lock:
+            _flights.pop(key, None)
+        flight.event.set()
+
+
+def in_thread(func):
+    """Cache calls of the async path run on worker threads, the event loop of the
+    bot runtime is shared by every bot and must never wait on Redis
+    """
+    return sync_to_async(func, thread_sensitive=False)
+
+
+def poll_book(key, lock_key, freshness):
+    """Returns the fresh book and whether the fetch lock is still held"""
+    book = read_fresh(key, freshness)
+    if book is not None:
+        return book, True
+
+    return None, market_cache.get(lock_key) is not None
+
+
+async def async_get_order_book(exchange, symbol, limit=20, freshness=None):
+    """get_order_book for async ccxt clients, callers dedupe their own requests"""
+    freshness = freshness_window() if freshness is None else freshness
+    key = book_key(exchange.id, symbol, limit)
+    lock_key = f"{key}_lock"
+
+    book = await in_thread(read_fresh)(key, freshness)
+    if book is not None:
+        record("hits")
+        return book
+
+    acquired = await in_thread(market_cache.add)(lock_key, True, LOCK_TIMEOUT)
+
+    if not acquired:
+        deadline = time.time() + LOCK_TIMEOUT
+        while time.time() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            book, locked = await in_thread(poll_book)(key, lock_key, freshness)
+            if book is not None:
+                record("shared")
+                return book
+            if not locked:
+                break
+
+    try:
+        book = await exchange.fetch_order_book(symbol, limit)
+        record("misses")
+        return await in_thread(store_book)(key, book)
+    finally:
+        if acquired:
+            await in_thread(market_cache.delete)(lock_key)
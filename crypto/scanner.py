@@ -0,0 +1,173 @@
+import hashlib
+import threading
+
+import numpy as np
+
+from crypto.columnar import get_columnar_snapshot
+from crypto.market_cache import get_symbol_entries
+
+
+# Join indexes kept for the most recent spot/swap symbol layouts
+JOIN_INDEX_CACHE_SIZE = 4
+
+_lock = threading.Lock()
+_join_indexes = {}
+
+
+def layout_key(spot, swap, quote):
+    digest = hashlib.sha1(quote.encode())
+    for snapshot in (spot, swap):
+        digest.update(snapshot["symbols"].tobytes())
+        digest.update(snapshot["symbol"].tobytes())
+
+    return digest.hexdigest()
+
+
+def build_join_index(spot, swap, quote="USDT"):
+    """Pairs every {base}/{quote} spot row with each {base}/{quote}:{quote} swap row
+
+    Returns two aligned arrays of row numbers into the spot and swap snapshots.
+    """
+    swap_ids = {symbol: i for i, symbol in enumerate(swap["symbols"].tolist())}
+    suffix = f"/{quote}"
+
+    hedge_of = np.full(len(spot["symbols"]), -1, dtype=np.int64)
+    for i, symbol in enumerate(spot["symbols"].tolist()):
+        if symbol.endswith(suffix):
+            hedge_of[i] = swap_ids.get(f"{symbol}:{quote}", -1)
+
+    # Swap rows of symbol s are order[starts[s] : starts[s] + counts[s]]
+    order = np.argsort(swap["symbol"], kind="stable")
+    counts = np.bincount(swap["symbol"], minlength=len(swap["symbols"]))
+    starts = np.cumsum(counts) - counts
+
+    spot_rows = np.nonzero(hedge_of[spot["symbol"]] >= 0)[0]
+    hedge_symbols = hedge_of[spot["symbol"][spot_rows]]
+    matches = counts[hedge_symbols]
+
+    left = np.repeat(spot_rows, matches)
+    first_match = np.repeat(np.cumsum(matches) - matches, matches)
+    offsets = np.arange(matches.sum()) - first_match
+    right = order[np.repeat(starts[hedge_symbols], matches) + offsets]
+
+    return left, right
+
+
+def get_join_index(spot, swap, quote="USDT"):
+    key = layout_key(spot, swap, quote)
+
+    with _lock:
+        index = _join_indexes.get(key)
+        if index is None:
+            if len(_join_indexes) >= JOIN_INDEX_CACHE_SIZE:
+                _join_indexes.pop(next(iter(_join_indexes)))
+            index = build_join_index(spot, swap, quote)
+            _join_indexes[key] = index
+
+    return index
+
+
+def exchange_mask(snapshot, rows, exchanges):
+    if exchanges is None:
+        return np.ones(len(rows), dtype=bool)
+
+    allowed = np.isin(snapshot["exchanges"], list(exchanges))
+    return allowed[snapshot["exchange"][rows]]
+
+
+def listed_on_spot_mask(spot, swap, left, right):
+    """True where the exchange of the swap row also lists the spot symbol"""
+    spot_exchange_ids = {e: i for i, e in enumerate(spot["exchanges"].tolist())}
+    as_spot_exchange = np.array(
+        [spot_exchange_ids.get(e, -1) for e in swap["exchanges"].tolist()],
+        dtype=np.int64,
+    )
+    hedge_exchange = as_spot_exchange[swap["exchange"][right]]
+
+    width = max(len(spot["exchanges"]), 1)
+    listed = spot["symbol"].astype(np.int64) * width + spot["exchange"]
+    wanted = spot["symbol"][left].astype(np.int64) * width + hedge_exchange
+    return (hedge_exchange >= 0) & np.isin(wanted, listed)
+
+
+def scan_spot_perp(
+    spot,
+    swap,
+    min_rate,
+    max_rate,
+    spot_exchanges=None,
+    hedge_exchanges=None,
+    min_volume=None,
+    hedge_listed_on_spot=False,
+    quote="USDT",
+):
+    """Buys spot at the ask and sells the perpetual at the bid (last if no bid)
+
+    Works on columnar snapshots and returns (symbol, exchange, hedge_symbol,
+    hedge_exchange, profit_rate) tuples with min_rate < profit_rate < max_rate,
+    best first. Any swap exchange may hedge, with hedge_listed_on_spot only
+    exchanges that also list the coin on spot, as calculate_spot_arbitrage did.
+    """
+    left, right = get_join_index(spot, swap, quote)
+
+    buy_price = spot["ask"][left]
+    bid = swap["bid"][right]
+    sell_price = np.where(np.isnan(bid) | (bid == 0), swap["last"][right], bid)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        profit_rate = sell_price / buy_price - 1
+
+    mask = (min_rate < profit_rate) & (profit_rate < max_rate)
+    mask &= exchange_mask(spot, left, spot_exchanges)
+    mask &= exchange_mask(swap, right, hedge_exchanges)
+    if min_volume is not None:
+        mask &= spot["quoteVolume"][left] >= min_volume
+        mask &= swap["quoteVolume"][right] >= min_volume
+    if hedge_listed_on_spot:
+        mask &= listed_on_spot_mask(spot, swap, left, right)
+
+    found = np.nonzero(mask)[0]
+    found = found[np.argsort(-profit_rate[found], kind="stable")]
+
+    spot_rows = left[found]
+    swap_rows = right[found]
+
+    return list(
+        zip(
+            spot["symbols"][spot["symbol"][spot_rows]].tolist(),
+            spot["exchanges"][spot["exchange"][spot_rows]].tolist(),
+            swap["symbols"][swap["symbol"][swap_rows]].tolist(),
+            swap["exchanges"][swap["exchange"][swap_rows]].tolist(),
+            profit_rate[found].tolist(),
+        )
+    )
+
+
+def find_spot_perp_arbitrages(min_rate, max_rate, **filters):
+    """Scans the cached snapshots, returns ranked {"from", "hedge", "profit_rate"} dicts"""
+    spot = get_columnar_snapshot("spot")
+    swap = get_columnar_snapshot("swap")
+    if spot is None or swap is None:
+        return []
+
+    candidates = scan_spot_perp(spot, swap, min_rate, max_rate, **filters)
+    if not candidates:
+        return []
+
+    spot_entries = get_symbol_entries("spot", {c[0] for c in candidates})
+    swap_entries = get_symbol_entries("swap", {c[2] for c in candidates})
+
+    arbitrages = []
+    for symbol, exchange, hedge_symbol, hedge_exchange, profit_rate in candidates:
+        try:
+            arbitrages.append(
+                {
+                    "from": spot_entries[symbol]["exchanges"][exchange],
+                    "hedge": swap_entries[hedge_symbol]["exchanges"][hedge_exchange],
+                    "profit_rate": profit_rate,
+                }
+            )
+        except KeyError:
+            continue
+
+    return arbitrages
@@ -0,0 +1,19 @@
+import msgpack
+import orjson
+from django_redis.serializers.base import BaseSerializer
+
+
+class MsgpackSerializer(BaseSerializer):
+    def dumps(self, value):
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, value):
+        return msgpack.unpackb(value, raw=False, strict_map_key=False)
+
+
+class OrjsonSerializer(BaseSerializer):
+    def dumps(self, value):
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, value):
+        return orjson.loads(value)
@@ -1,14 +1,19 @@
+import asyncio
 import traceback
 import datetime
 from django.core.cache import cache
-import ccxt
 
 from crypto.business_functions import (
     calculate_spread_rate,
-    calculate_avg_price,
     determine_price_str,
-    telegram_bot_sendtext,
 )
+from crypto.client_pool import get_client
+from crypto.depth import average_prices, build_depth_profiles
+from crypto.ingestion import fetch_order_books
+from crypto.notifications import notify
+from crypto.opportunities import add_opportunity, opportunity_id
+from crypto.order_books import get_order_book
+from crypto.scanner import find_spot_perp_arbitrages
 from octochain.celery import app
 
 exchanges = {
@@ -26,27 +31,14 @@ def initialize_exchange_functions():
 
     for exchange_id, values in exchanges.items():
         try:
-            exchange_class = getattr(ccxt, exchange_id)
-            markets = cache.get(f"{exchange_id}_markets")
-            currencies = cache.get(f"{exchange_id}_currencies")
-            markets_by_id = cache.get(f"{exchange_id}_markets_by_id")
-
             exchange_functions[exchange_id] = {}
 
-            if not markets:
-                raise "No market details"
-
             for _type in ["spot", "swap"]:
-                exchange = exchange_class(
-                    {
-                        "options": {
-                            "defaultType": _type,
-                        },
-                    }
-                )
-                exchange.markets = markets
-                exchange.currencies = currencies
-                exchange.markets_by_id = markets_by_id
+                exchange = get_client(exchange_id, _type)
+
+                if not exchange.markets:
+                    raise "No market details"
+
                 exchange_functions[exchange_id][_type] = exchange
         except:
             continue
@@ -57,9 +49,9 @@ def initialize_exchange_functions():
 def spot_arb_details(symbol, from_exc, hedge_symbol, hedge_exc):
     exchange_functions = initialize_exchange_functions()
 
-    from_board = exchange_functions[from_exc]["spot"].fetch_order_book(symbol, limit=20)
-    hedge_board = exchange_functions[hedge_exc]["swap"].fetch_order_book(
-        hedge_symbol, limit=20
+    from_board = get_order_book(exchange_functions[from_exc]["spot"], symbol, 20)
+    hedge_board = get_order_book(
+        exchange_functions[hedge_exc]["swap"], hedge_symbol, 20
     )
 
     details = {
@@ -70,50 +62,20 @@ def spot_arb_details(symbol, from_exc, hedge_symbol, hedge_exc):
 
 
 def calculate_spot_arbitrage():
+    arbitrages = []
     try:
-        spot = cache.get("spot")
-        swap = cache.get("swap")
-
         from_exchanges = ["mexc", "binance", "gate"]
         to_exchanges = ["binance", "gate"]
 
-        arbitrages = []
-
-        for coin in spot.values():
-            coin_symbol = coin["symbol"]
-            coin_exchanges = coin["exchanges"]
-
-            if coin["quote"] != "USDT":
-                continue
-
-            for from_exchange, from_exchange_values in coin_exchanges.items():
-                if from_exchange not in from_exchanges:
-                    continue
-
-                for to_exchange, to_exchange_values in coin_exchanges.items():
-                    if to_exchange not in to_exchanges:
-                        continue
-
-                    try:
-                        hedge = swap[f"{coin_symbol}:USDT"]["exchanges"][to_exchange]
-                    except:
-                        hedge = None
-                        continue
-
-                    try:
-                        buy_price = from_exchange_values["ask"]
-                        sell_price = hedge["bid"] if hedge["bid"] else hedge["last"]
-                        profit_rate = ((sell_price / buy_price) - 1) * 100
-                    except:
-                        continue
-
-                    if 0.6 < profit_rate < 5:
-                        arbitrage = {
-                            "from": from_exchange_values,
-                            "profit_rate": profit_rate,
-                            "hedge": hedge,
-                        }
-                        arbitrages.append(arbitrage)
+        for arbitrage in find_spot_perp_arbitrages(
+            0.006,
+            0.05,
+            spot_exchanges=from_exchanges,
+            hedge_exchanges=to_exchanges,
+            hedge_listed_on_spot=True,
+        ):
+            arbitrage["profit_rate"] = arbitrage["profit_rate"] * 100
+            arbitrages.append(arbitrage)
     except:
         print(traceback.format_exc())
 
@@ -123,10 +85,16 @@ def calculate_spot_arbitrage():
 @app.task
 def spot_arbitrage_opportunuties():
     arbitrages = calculate_spot_arbitrage()
-    exchange_functions = initialize_exchange_functions()
 
     cache.set("all_arbitrages", arbitrages, 120)
 
+    books = []
+    for arbitrage in arbitrages:
+        symbol = arbitrage["from"]["symbol"]
+        books.append((arbitrage["from"]["exchange"], "spot", symbol))
+        books.append((arbitrage["hedge"]["exchange"], "swap", f"{symbol}:USDT"))
+    order_books = asyncio.run(fetch_order_books(books))
+
     opportunuties = []
     desired_budget_levels = [
         {"budget": 50, "profit_rate": 0.008},
@@ -135,7 +103,29 @@ def spot_arbitrage_opportunuties():
     ]
     max_profit_rate = 0.05
 
+    candidates = []
     for arbitrage in arbitrages:
+        symbol = arbitrage["from"]["symbol"]
+        from_exchange = arbitrage["from"]["exchange"]
+        to_exchange = arbitrage["hedge"]["exchange"]
+
+        try:
+            from_exc_asks = order_books[(from_exchange, "spot", symbol)]["asks"]
+            hedge_bids = order_books[(to_exchange, "swap", f"{symbol}:USDT")]["bids"]
+        except KeyError:
+            continue
+
+        candidates.append((arbitrage, from_exc_asks, hedge_bids))
+
+    budgets = [budget_level["budget"] for budget_level in desired_budget_levels]
+    avg_asks, asks_reached = average_prices(
+        build_depth_profiles([candidate[1] for candidate in candidates]), budgets
+    )
+    avg_hedge_bids, hedge_bids_reached = average_prices(
+        build_depth_profiles([candidate[2] for candidate in candidates]), budgets
+    )
+
+    for row, (arbitrage, _, _) in enumerate(candidates):
         symbol = arbitrage["from"]["symbol"]
         from_exchange_values = arbitrage["from"]
         hedge_exchange_values = arbitrage["hedge"]
@@ -143,26 +133,13 @@ def spot_arbitrage_opportunuties():
         from_exchange = from_exchange_values["exchange"]
         to_exchange = hedge_exchange_values["exchange"]
 
-        try:
-            from_exc_asks = exchange_functions[from_exchange]["spot"].fetch_order_book(
-                symbol, limit=20
-            )["asks"]
-            hedge_bids = exchange_functions[to_exchange]["swap"].fetch_order_book(
-                f"{symbol}:USDT", limit=20
-            )["bids"]
-        except Exception as ex:
-            print(ex)
-            continue
-
         found = 0
         budget_levels = []
-        for budget_level in desired_budget_levels:
-            avg_ask, ask_reached = calculate_avg_price(
-                from_exc_asks, budget_level["budget"]
-            )
-            avg_hedge_bid, hedge_bid_reached = calculate_avg_price(
-                hedge_bids, budget_level["budget"]
-            )
+        for column, budget_level in enumerate(desired_budget_levels):
+            avg_ask = avg_asks[row, column].item()
+            avg_hedge_bid = avg_hedge_bids[row, column].item()
+            ask_reached = asks_reached[row, column]
+            hedge_bid_reached = hedge_bids_reached[row, column]
             if ask_reached and hedge_bid_reached:
                 nominal_profit = (
                     budget_level["budget"] / avg_ask * avg_hedge_bid
@@ -199,9 +176,9 @@ def spot_arbitrage_opportunuties():
                 "hedge": hedge_exchange_values,
                 "budget_levels": budget_levels,
             }
-            cache.set(
-                f"arb_{symbol}-{from_exchange}-{to_exchange}", arb_opportunity, 120
-            )
-            telegram_bot_sendtext(
-                f"Spot Arbitrage found: {symbol}-{from_exchange}-{to_exchange}"
+            profit_rate = max(level["profit_rate"] for level in budget_levels)
+            add_opportunity(
+                symbol, from_exchange, to_exchange, arb_opportunity, profit_rate, 120
             )
+            _id = opportunity_id(symbol, from_exchange, to_exchange)
+            notify(f"Spot Arbitrage found: {_id}", dedup_key=_id)
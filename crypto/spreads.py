@@ -0,0 +1,94 @@
+import numpy as np
+
+from crypto.columnar import get_columnar_snapshot
+from crypto.events import publish_event
+from crypto.market_cache import market_cache
+from crypto.market_state import get_snapshot_version
+
+
+SPOT_SPREADS_KEY = "spot_spreads"
+SPREAD_TOP_K = 200
+# Larger dislocations are almost always different coins sharing a ticker
+SPREAD_MAX_RATE = 0.5
+
+
+def dense_matrix(snapshot, column):
+    matrix = np.full((len(snapshot["symbols"]), len(snapshot["exchanges"])), np.nan)
+    matrix[snapshot["symbol"], snapshot["exchange"]] = snapshot[column]
+    return matrix
+
+
+def spread_matrix(snapshot):
+    """(symbols x buy exchange x sell exchange) rates of selling at the bid after
+    buying at the ask, NaN where a side is missing or both exchanges are the same
+    """
+    asks = dense_matrix(snapshot, "ask")
+    bids = dense_matrix(snapshot, "bid")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = bids[:, None, :] / asks[:, :, None] - 1
+
+    same_exchange = np.eye(len(snapshot["exchanges"]), dtype=bool)
+    rates[:, same_exchange] = np.nan
+    return rates
+
+
+def top_spreads(snapshot, k=SPREAD_TOP_K, max_rate=SPREAD_MAX_RATE):
+    rates = spread_matrix(snapshot)
+    flat = rates.ravel()
+
+    valid = np.flatnonzero(np.isfinite(flat) & (flat < max_rate))
+    k = min(k, len(valid))
+    if k == 0:
+        return []
+
+    best = valid[np.argpartition(flat[valid], -k)[-k:]]
+    best = best[np.argsort(-flat[best], kind="stable")]
+    symbols, buy, sell = np.unravel_index(best, rates.shape)
+
+    asks = dense_matrix(snapshot, "ask")[symbols, buy]
+    bids = dense_matrix(snapshot, "bid")[symbols, sell]
+    volumes = np.nan_to_num(dense_matrix(snapshot, "quoteVolume"))
+
+    columns = {
+        "symbol": snapshot["symbols"][symbols].tolist(),
+        "buy_exchange": snapshot["exchanges"][buy].tolist(),
+        "sell_exchange": snapshot["exchanges"][sell].tolist(),
+        "ask": asks.tolist(),
+        "bid": bids.tolist(),
+        "buy_volume": volumes[symbols, buy].tolist(),
+        "sell_volume": volumes[symbols, sell].tolist(),
+        "spread_rate": flat[best].tolist(),
+    }
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def get_spot_spreads_version():
+    return market_cache.get(f"{SPOT_SPREADS_KEY}_version")
+
+
+def get_spot_spreads():
+    return market_cache.get(SPOT_SPREADS_KEY)
+
+
+def store_spot_spreads(timeout=300):
+    """Recomputes the top spot dislocations only when the spot snapshot changed"""
+    version = get_snapshot_version("spot")
+    if version is None:
+        return None
+
+    version = str(version)
+    if get_spot_spreads_version() == version:
+        market_cache.touch(SPOT_SPREADS_KEY, timeout)
+        market_cache.touch(f"{SPOT_SPREADS_KEY}_version", timeout)
+        return version
+
+    snapshot = get_columnar_snapshot("spot")
+    if snapshot is None:
+        return None
+
+    table = {"version": version, "spreads": top_spreads(snapshot)}
+    market_cache.set(SPOT_SPREADS_KEY, table, timeout)
+    market_cache.set(f"{SPOT_SPREADS_KEY}_version", version, timeout)
+    publish_event(SPOT_SPREADS_KEY, {"version": version})
+    return version
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import traceback
+
+import aiohttp
+from django.core.cache import cache
+
+from crypto.market_cache import market_cache
+from crypto.market_state import set_exchange_prices
+
+
+logger = logging.getLogger(__name__)
+
+TICKER_FIELDS = [
+    "bid",
+    "ask",
+    "last",
+    "previousClose",
+    "change",
+    "percentage",
+    "baseVolume",
+    "quoteVolume",
+]
+
+# Seconds a stream marker lives, REST polling skips pairs with a live stream
+STREAM_MARKER_TIMEOUT = 10
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_binance_tickers(message):
+    data = message
+    if isinstance(data, dict):
+        data = data.get("data", data)
+    if isinstance(data, dict):
+        data = [data]
+
+    updates = []
+    for item in data:
+        if not isinstance(item, dict) or "s" not in item:
+            continue
+
+        if item.get("e") == "24hrTicker":
+            values = {
+                "last": to_float(item.get("c")),
+                "previousClose": to_float(item.get("x")),
+                "change": to_float(item.get("p")),
+                "percentage": to_float(item.get("P")),
+                "baseVolume": to_float(item.get("v")),
+                "quoteVolume": to_float(item.get("q")),
+            }
+            if "b" in item:
+                values["bid"] = to_float(item["b"])
+                values["ask"] = to_float(item["a"])
+        else:
+            values = {"bid": to_float(item.get("b")), "ask": to_float(item.get("a"))}
+
+        updates.append((item["s"], values))
+
+    return updates
+
+
+def parse_okx_tickers(message):
+    updates = []
+    for item in message.get("data", []):
+        last = to_float(item.get("last"))
+        open_price = to_float(item.get("open24h"))
+        change = last - open_price if last and open_price else None
+        percentage = change / open_price * 100 if change is not None else None
+
+        if item.get("instType") == "SPOT":
+            base_volume = to_float(item.get("vol24h"))
+            quote_volume = to_float(item.get("volCcy24h"))
+        else:
+            base_volume = to_float(item.get("volCcy24h"))
+            quote_volume = base_volume * last if base_volume and last else None
+
+        values = {
+            "bid": to_float(item.get("bidPx")),
+            "ask": to_float(item.get("askPx")),
+            "last": last,
+            "change": change,
+            "percentage": percentage,
+            "baseVolume": base_volume,
+            "quoteVolume": quote_volume,
+        }
+        updates.append((item["instId"], values))
+
+    return updates
+
+
+def okx_subscription(market_ids):
+    return {
+        "op": "subscribe",
+        "args": [{"channel": "tickers", "instId": market_id} for market_id in market_ids],
+    }
+
+
+STREAMS = {
+    ("binance", "spot"): {
+        "url": "wss://stream.binance.com:9443/ws/!ticker@arr",
+        "parser": parse_binance_tickers,
+    },
+    ("binance", "swap"): {
+        "url": "wss://fstream.binance.com/stream?streams=!ticker@arr/!bookTicker",
+        "parser": parse_binance_tickers,
+    },
+    ("okx", "spot"): {
+        "url": "wss://ws.okx.com:8443/ws/v5/public",
+        "parser": parse_okx_tickers,
+        "subscription": okx_subscription,
+        "ping": "ping",
+    },
+    ("okx", "swap"): {
+        "url": "wss://ws.okx.com:8443/ws/v5/public",
+        "parser": parse_okx_tickers,
+        "subscription": okx_subscription,
+        "ping": "ping",
+    },
+}
+
+
+def is_stream_live(exchange_id, _type):
+    return cache.get(f"{exchange_id}_{_type}_stream") is not None
+
+
+class TickerStream:
+    """Applies websocket ticker deltas into the {exchange}_{type}_prices key"""
+
+    def __init__(
+        self,
+        exchange_id,
+        _type,
+        spec,
+        url=None,
+        flush_interval=1,
+        idle_timeout=20,
+        max_backoff=20,
+    ):
+        self.exchange_id = exchange_id
+        self._type = _type
+        self.spec = spec
+        self.url = url or spec["url"]
+        self.flush_interval = flush_interval
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+
+        self.symbols = {}
+        self.tickers = {}
+        self.dirty = False
+        self.connected = False
+
+    def load_symbols(self):
+        markets = market_cache.get(f"{self.exchange_id}_markets") or {}
+
+        self.symbols = {
+            market["id"]: symbol
+            for symbol, market in markets.items()
+            if market.get("type") == self._type and market.get("active") != False
+        }
+
+    def load_snapshot(self):
+        prices = cache.get(f"{self.exchange_id}_{self._type}_prices") or {}
+        self.tickers = dict(prices)
+
+    def apply(self, updates):
+        for market_id, values in updates:
+            symbol = self.symbols.get(market_id)
+            if symbol is None:
+                continue
+
+            ticker = self.tickers.get(symbol)
+            if ticker is None:
+                ticker = {"symbol": symbol, **{field: None for field in TICKER_FIELDS}}
+            else:
+                ticker = dict(ticker)
+
+            ticker.update(values)
+            self.tickers[symbol] = ticker
+            self.dirty = True
+
+    def flush(self):
+        if self.connected:
+            cache.set(
+                f"{self.exchange_id}_{self._type}_stream", True, STREAM_MARKER_TIMEOUT
+            )
+
+        if not self.dirty:
+            return
+
+        set_exchange_prices(self.exchange_id, self._type, self.tickers)
+        self.dirty = False
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except:
+                logger.error(traceback.format_exc())
+
+    async def consume(self, session):
+        self.load_symbols()
+        self.load_snapshot()
+
+        async with session.ws_connect(self.url, heartbeat=self.idle_timeout) as ws:
+            subscription = self.spec.get("subscription")
+            if subscription:
+                await ws.send_json(subscription(list(self.symbols)))
+
+            self.connected = True
+            logger.info(f"{self.exchange_id} {self._type} stream connected")
+
+            while True:
+                try:
+                    msg = await ws.receive(timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if self.spec.get("ping"):
+                        await ws.send_str(self.spec["ping"])
+                        continue
+                    raise
+
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    if msg.data == "pong":
+                        continue
+                    self.apply(self.spec["parser"](json.loads(msg.data)))
+                elif msg.type in (
+                    aiohttp.WSMsgType.CLOSE,
+                    aiohttp.WSMsgType.CLOSED,
+                    aiohttp.WSMsgType.CLOSING,
+                    aiohttp.WSMsgType.ERROR,
+                ):
+                    break
+
+        raise ConnectionError(f"{self.exchange_id} {self._type} stream closed")
+
+    async def fallback(self):
+        from crypto.tasks import fetch_exchange_price
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None,
+            fetch_exchange_price,
+            self.exchange_id,
+            {"types": {self._type: None}},
+        )
+
+    async def run(self, session):
+        backoff = 1
+        flusher = asyncio.ensure_future(self.flush_loop())
+
+        try:
+            while True:
+                try:
+                    await self.consume(session)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as ex:
+                    logger.error(f"{self.exchange_id} {self._type} stream dropped: {ex}")
+
+                if self.connected:
+                    backoff = 1
+                self.connected = False
+                cache.delete(f"{self.exchange_id}_{self._type}_stream")
+
+                await self.fallback()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        finally:
+            flusher.cancel()
+
+
+async def run_ticker_streams(pairs=None, urls=None):
+    urls = urls or {}
+    pairs = pairs or list(STREAMS)
+
+    async with aiohttp.ClientSession() as session:
+        streams = [
+            TickerStream(
+                exchange_id,
+                _type,
+                STREAMS[(exchange_id, _type)],
+                url=urls.get((exchange_id, _type)),
+            )
+            for exchange_id, _type in pairs
+        ]
+        await asyncio.gather(*[stream.run(session) for stream in streams])
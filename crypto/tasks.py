@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from django.core.cache import cache
 import traceback
@@ -5,8 +6,23 @@ import traceback
 import ccxt
 
 from octochain.celery import app
+from crypto.market_cache import market_cache, get_symbol_entries, set_symbol_entries
 from crypto.setup_functions import *
+from crypto.ingestion import fetch_all_exchange_prices
+from crypto.market_state import (
+    MarketStateBuilder,
+    set_exchange_prices,
+    set_snapshot_version,
+)
+from crypto.market_metadata import store_exchange_markets
+from crypto.client_pool import get_client
+from crypto.key_registry import PRICE_KEYS, live_keys
+from crypto.columnar import set_columnar_snapshot
+from crypto.events import publish_price_deltas
+from crypto.notifications import flush_notifications
 from crypto.spot_arbitrage import spot_arbitrage_opportunuties
+from crypto.future_arbitrage import store_future_arbitrages
+from crypto.spreads import store_spot_spreads
 
 logger = logging.getLogger()
 c_handler = logging.StreamHandler()
@@ -29,12 +45,15 @@ exchanges = {
     "kucoin": {"types": {"spot": None}},
 }
 
+market_builder = MarketStateBuilder()
+
 
 @app.on_after_finalize.connect
 def setup_periodic_tasks(sender, **kwargs):
     sender.add_periodic_task(120, fetch_exchange_markets.s())
     sender.add_periodic_task(20, fetch_exchange_prices.s())
     sender.add_periodic_task(15, create_data.s())
+    sender.add_periodic_task(5, send_notifications.s())
     # sender.add_periodic_task(20, spot_arbitrage_opportunuties.s())
 
 
@@ -84,10 +103,16 @@ def fetch_exchange_market(exchange_id):
         currencies = exchange.currencies
         markets_by_id = exchange.markets_by_id
 
-        cache.set(f"{exchange_id}_markets", markets, 60 * 60)
-        cache.set(f"{exchange_id}_currencies", currencies, 60 * 60)
-        cache.set(f"{exchange_id}_markets_by_id", markets_by_id, 60 * 60)
-        logger.info(f"{exchange_id} markets set!")
+        diff = store_exchange_markets(
+            exchange_id, markets, currencies, markets_by_id, 60 * 60
+        )
+        if diff is None:
+            logger.info(f"{exchange_id} markets unchanged")
+        else:
+            logger.info(
+                f"{exchange_id} markets set! added: {len(diff['added'])} "
+                f"removed: {len(diff['removed'])} changed: {len(diff['changed'])}"
+            )
     except:
         logger.error(traceback.format_exc())
 
@@ -95,8 +120,7 @@ def fetch_exchange_market(exchange_id):
 @app.task
 def fetch_exchange_prices():
     try:
-        for exchange_id, values in exchanges.items():
-            fetch_exchange_price.delay(exchange_id, values)
+        asyncio.run(fetch_all_exchange_prices(exchanges))
 
     except:
         logger.error(traceback.format_exc())
@@ -105,21 +129,11 @@ def fetch_exchange_prices():
 @app.task
 def fetch_exchange_price(exchange_id, values):
     try:
-        exchange_class = getattr(ccxt, exchange_id)
-        markets = cache.get(f"{exchange_id}_markets")
-
-        if not markets:
-            raise "No market details"
-
         for _type in values["types"]:
-            exchange = exchange_class(
-                {
-                    "options": {
-                        "defaultType": _type,
-                    },
-                }
-            )
-            exchange.markets = markets
+            exchange = get_client(exchange_id, _type)
+
+            if not exchange.markets:
+                raise "No market details"
 
             if exchange.has[_type] == True:  # ! TODO: Check this if necessary
                 if _type == "future" and exchange_id == "gate":
@@ -131,7 +145,7 @@ def fetch_exchange_price(exchange_id, values):
             else:
                 prices = {}
 
-            cache.set(f"{exchange_id}_{_type}_prices", prices, 300)
+            set_exchange_prices(exchange_id, _type, prices)
             logger.debug(f"{exchange_id} {_type} prices set!")
     except:
         logger.error(traceback.format_exc())
@@ -140,62 +154,41 @@ def fetch_exchange_price(exchange_id, values):
 @app.task
 def create_data():
     try:
-        spot = {}
-        swap = {}
-        future = {}
-
-        market_names = cache.keys("*prices")
-        for market in market_names:
-            exchange_id = market.split("_")[0]
-            _type = market.split("_")[1]
-
-            markets = cache.get(f"{exchange_id}_markets")
-            currencies = cache.get(f"{exchange_id}_currencies")
-            prices = cache.get(f"{exchange_id}_{_type}_prices")
-
-            if _type == "spot":
-                create_empty_exchange_dict(prices, spot, exchange_id)
-                insert_exchange_market_details(markets, spot, exchange_id)
-                insert_exchange_currency_details(currencies, spot, exchange_id)
-                insert_exchange_price_details(prices, spot, exchange_id)
-                define_best_exchanges_for_tickers(spot)
-                insert_common_details(spot)
-
-            if _type == "swap":
-                create_empty_exchange_dict(prices, swap, exchange_id)
-                insert_exchange_market_details(markets, swap, exchange_id)
-                insert_exchange_price_details(prices, swap, exchange_id)
-                define_best_exchanges_for_tickers(swap)
-                insert_common_details(swap)
-
-            if _type == "future":
-                create_empty_exchange_dict(prices, future, exchange_id)
-                insert_exchange_market_details(markets, future, exchange_id)
-                insert_exchange_price_details(prices, future, exchange_id)
-                define_best_exchanges_for_tickers(future)
-                insert_common_details(future)
-
-        spot = {
-            key: value
-            for key, value in spot.items()
-            if value.get("type") == "spot" and len(value.get("exchanges")) > 0
-        }
-        swap = {
-            key: value
-            for key, value in swap.items()
-            if value.get("type") == "swap" and len(value.get("exchanges")) > 0
-        }
-        future = {
-            key: value
-            for key, value in future.items()
-            if value.get("type") == "future" and len(value.get("exchanges")) > 0
-        }
-
-        cache.set("spot", spot, 300)
-        cache.set("swap", swap, 300)
-        cache.set("future", future, 300)
+        market_names = live_keys(PRICE_KEYS)
+        full = len(market_builder.versions) == 0
+        touched = market_builder.update(market_names)
+
+        for _type, tickers in touched.items():
+            if not tickers:
+                market_cache.touch(_type, 300)
+                market_cache.touch(f"{_type}_symbols", 300)
+                market_cache.touch(f"{_type}_version", 300)
+                cache.touch(f"{_type}_columnar", 300)
+                continue
+
+            snapshot = market_builder.snapshot(_type)
+            previous = get_symbol_entries(_type, tickers)
+            market_cache.set(_type, snapshot, 300)
+            set_symbol_entries(_type, snapshot, tickers, full=full)
+            set_columnar_snapshot(_type, snapshot)
+            set_snapshot_version(_type)
+            publish_price_deltas(_type, snapshot, tickers, previous)
+
+        store_future_arbitrages()
+        store_spot_spreads()
 
     except:
         logger.error(traceback.format_exc())
 
     # cache.set("binance", binance.fetch_tickers(), 6000)
+
+
+@app.task
+def send_notifications():
+    try:
+        sent = flush_notifications()
+        if sent:
+            logger.info(f"{sent} notifications sent")
+
+    except:
+        logger.error(traceback.format_exc())
@@ -6,5 +6,6 @@ urlpatterns = [
     path("tickers", views.tickers, name="tickers"),
     path("future-arbitrage", views.future_arbitrages, name="future_arbitrages"),
     path("spot-arbitrage", views.spot_arbitrages, name="spot_arbitrages"),
+    path("spot-spreads", views.spot_spreads, name="spot_spreads"),
     path("spot-arb-details", views.spot_arb_details_view, name="spot_arb_details"),
 ]
@@ -1,17 +1,25 @@
+from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.core.cache import cache
-
-from crypto.future_arbitrage import calculate_future_arbitrage
+from django.views.decorators.http import condition
+
+from crypto.market_cache import market_cache
+from crypto.future_arbitrage import (
+    calculate_future_arbitrage,
+    get_future_arbitrages,
+    get_future_arbitrages_version,
+)
+from crypto.opportunities import get_opportunities
 from crypto.spot_arbitrage import spot_arb_details
+from crypto.spreads import get_spot_spreads, get_spot_spreads_version
 
 
 @api_view(["GET"])
 def tickers(request):
     if request.method == "GET":
-        spot = cache.get("spot")
-        swap = cache.get("swap")
-        future = cache.get("future")
+        spot = market_cache.get("spot")
+        swap = market_cache.get("swap")
+        future = market_cache.get("future")
 
         spot = list(spot.values())
         spot = [i for i in spot if i["quote"] == "USDT"]
@@ -29,24 +37,83 @@ def tickers(request):
         return Response({"spot": spot, "swap": swap, "future": future})
 
 
+def future_arbitrages_etag(request):
+    version = get_future_arbitrages_version()
+    return f'"{version}"' if version else None
+
+
+@condition(etag_func=future_arbitrages_etag)
 @api_view(["GET"])
 def future_arbitrages(request):
     if request.method == "GET":
-        arbitrages = calculate_future_arbitrage()
+        table = get_future_arbitrages()
+        if table is None:
+            arbitrages = calculate_future_arbitrage()
+
+            return Response({"arbitrages": arbitrages})
+
+        return Response(
+            {"arbitrages": table["arbitrages"]},
+            headers={"ETag": f'"{table["version"]}"'},
+        )
+
+
+def spot_spreads_etag(request):
+    version = get_spot_spreads_version()
+    return f'"{version}"' if version else None
+
+
+@condition(etag_func=spot_spreads_etag)
+@api_view(["GET"])
+def spot_spreads(request):
+    if request.method == "GET":
+        table = get_spot_spreads()
+        if table is None:
+            return Response({"spreads": []})
 
-        return Response({"arbitrages": arbitrages})
+        return Response(
+            {"spreads": table["spreads"]},
+            headers={"ETag": f'"{table["version"]}"'},
+        )
 
 
 @api_view(["GET"])
 def spot_arbitrages(request):
     if request.method == "GET":
-        arbitrages = []
-        arbs_keys = cache.keys("arb_*")
-        for arb_key in arbs_keys:
-            arb = cache.get(arb_key)
-            arbitrages.append(arb)
-
-        return Response({"arbitrages": arbitrages})
+        limit = request.query_params.get("limit")
+        offset = request.query_params.get("offset", 0)
+
+        try:
+            limit = int(limit) if limit else None
+            offset = int(offset)
+        except ValueError:
+            return Response(
+                {"error": "limit and offset must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if (limit is not None and limit < 1) or offset < 0:
+            return Response(
+                {"error": "limit must be positive and offset not negative"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        from_exchange = request.query_params.get("from_exc")
+        to_exchange = request.query_params.get("hedge_exc")
+        if bool(from_exchange) != bool(to_exchange):
+            return Response(
+                {"error": "from_exc and hedge_exc must be given together"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        arbitrages, total = get_opportunities(
+            limit=limit,
+            offset=offset,
+            from_exchange=from_exchange,
+            to_exchange=to_exchange,
+        )
+
+        return Response({"arbitrages": arbitrages, "total": total})
 
 
 @api_view(["POST"])
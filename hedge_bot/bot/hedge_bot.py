@@ -1,26 +1,34 @@
 import logging
-from time import sleep
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import perf_counter, sleep
 from datetime import datetime, timedelta
 from django.utils.timezone import now
 import os
 import traceback
-from django.core.cache import cache
-
-
-import ccxt
 
 from hedge_bot.models import HedgeBot, HedgeBotTx, ExchangeApi, Exchange
+from hedge_bot.bot.ledger import PositionLedger
+from hedge_bot.bot.wakeups import PriceWatcher
+from django.conf import settings
+
+from crypto.client_pool import get_client, get_thread_client
+from crypto.events import price_channel
+from crypto.order_books import get_order_book
 from crypto.business_functions import (
     calculate_avg_price,
     calculate_spread_rate,
-    calculate_spot_fifo_average_cost,
-    calculate_hedge_fifo_average_cost,
 )
 
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Seconds a session waits for its balances and order books before skipping
+FETCH_DEADLINE = 5
+# Top of book spreads this close to min_open_profit/min_close_profit wake the bot
+WAKE_BAND = 0.002
+
 
 class HedgeBotClass:
     """Base HedgeBot class"""
@@ -35,6 +43,12 @@ class HedgeBotClass:
 
         self.setup_logger()
         self.spot_apis, self.hedge_apis, self.fees = self.setup_exchange_api()
+        self.ledger = PositionLedger(self.bot)
+        self.executor = None
+        self.pending = set()
+        self.latencies = deque(maxlen=100)
+        self.top_of_book = {}
+        self.watcher = None
 
         logger.debug(
             f"Tick: {self.tick} \n Spot APIs: {self.spot_apis} \n Hedge APIs: {self.hedge_apis}"
@@ -56,15 +70,7 @@ class HedgeBotClass:
                 idle = False
 
         if idle:
-            try:
-                last_tx_date = (
-                    HedgeBotTx.objects.filter(bot=self.bot)
-                    .order_by("-created_at")
-                    .first()
-                    .created_at
-                )
-            except:
-                last_tx_date = self.bot.created_at
+            last_tx_date = self.ledger.last_tx_date or self.bot.created_at
 
             idle_time = now() - last_tx_date
 
@@ -104,17 +110,12 @@ class HedgeBotClass:
                 "apiKey": public_key,
                 "secret": private_key,
                 "password": group,
-                "options": {
-                    "defaultType": "spot",
-                },
             }
 
             if bot_exchange == "bitmart":
                 params["uid"] = group
 
-            exchange_class = getattr(ccxt, bot_exchange)
-            exchange_class = exchange_class(params)
-            exchange_class.markets = cache.get(f"{bot_exchange}_markets")
+            exchange_class = get_client(bot_exchange, "spot", params)
 
             spot_apis[bot_exchange] = exchange_class
             fees["spot"][bot_exchange] = exchange_object.spot_fee
@@ -136,14 +137,9 @@ class HedgeBotClass:
                 "apiKey": public_key,
                 "secret": private_key,
                 "password": group,
-                "options": {
-                    "defaultType": "swap",
-                },
             }
 
-            exchange_class = getattr(ccxt, bot_exchange)
-            exchange_class = exchange_class(params)
-            exchange_class.markets = cache.get(f"{bot_exchange}_markets")
+            exchange_class = get_client(bot_exchange, "swap", params)
 
             hedge_apis[bot_exchange] = exchange_class
             fees["hedge"][bot_exchange] = exchange_object.future_fee
@@ -167,63 +163,100 @@ class HedgeBotClass:
         f_handler.setFormatter(f_format)
         logger.addHandler(f_handler)
 
-    def fetch_account_balances(self):
-        self.spot_balances = {}
-        self.hedge_balances = {}
-
-        for spot_exchange, spot_api in self.spot_apis.items():
-            ticks = ["USDT", self.tick]
-            balances = {}
-            spot_balance = spot_api.fetch_balance()
-
-            for tick in ticks:
-                try:
-                    balances[tick] = {
-                        "available": spot_balance[tick]["free"],
-                        "total": spot_balance[tick]["total"],
-                    }
-                except KeyError:
-                    balances[tick] = {"available": 0, "total": 0}
-
-            self.spot_balances[spot_exchange] = balances
-
-        for hedge_exchange, hedge_api in self.hedge_apis.items():
-            ticks = ["USDT"]
-            balances = {}
-            hedge_balance = hedge_api.fetch_balance()
-
-            for tick in ticks:
-                try:
-                    balances[tick] = {
-                        "available": hedge_balance[tick]["free"],
-                        "total": hedge_balance[tick]["total"],
-                    }
-                except KeyError:
-                    balances[tick] = {"available": 0, "total": 0}
-
-            self.hedge_balances[hedge_exchange] = balances
+    def parse_balances(self, balance, ticks):
+        balances = {}
+        for tick in ticks:
+            try:
+                balances[tick] = {
+                    "available": balance[tick]["free"],
+                    "total": balance[tick]["total"],
+                }
+            except KeyError:
+                balances[tick] = {"available": 0, "total": 0}
+
+        return balances
+
+    def fetch_balances(self, api, ticks):
+        return self.parse_balances(api.fetch_balance(), ticks)
+
+    def fetch_depth(self, api, ticker):
+        order_book = get_order_book(api, ticker, 20)
+        return {"asks": order_book["asks"], "bids": order_book["bids"]}
+
+    def on_thread_client(self, fetch, api, *args):
+        """Runs fetch with the worker thread's own client for the exchange of api"""
+        credentials = {
+            name: getattr(api, name)
+            for name in ("apiKey", "secret", "password", "uid")
+            if getattr(api, name)
+        }
+        thread_api = get_thread_client(api.id, api.options["defaultType"], credentials)
+        return fetch(thread_api, *args)
+
+    def fetch_market_data(self):
+        """Fetches every balance and order book concurrently, False if they are not
+        all back within FETCH_DEADLINE
+        """
+        if self.pending:
+            # Fetches that missed the last deadline would delay the new ones
+            _, self.pending = wait(self.pending, timeout=FETCH_DEADLINE)
+            if self.pending:
+                logger.warning(f"{len(self.pending)} late fetches still running")
+                return False
+
+        if self.executor is None:
+            calls = 2 * (len(self.spot_apis) + len(self.hedge_apis))
+            self.executor = ThreadPoolExecutor(max_workers=max(calls, 1))
+
+        submit = self.executor.submit
+        on_thread = self.on_thread_client
+        futures = {}
+        for side, apis in (("spot", self.spot_apis), ("hedge", self.hedge_apis)):
+            ticker = self.spot_ticker if side == "spot" else self.hedge_ticker
+            ticks = ["USDT", self.tick] if side == "spot" else ["USDT"]
+
+            for exchange, api in apis.items():
+                balances = submit(on_thread, self.fetch_balances, api, ticks)
+                order_book = submit(on_thread, self.fetch_depth, api, ticker)
+                futures[balances] = (f"{side}_balances", exchange)
+                futures[order_book] = (f"{side}_order_books", exchange)
+
+        _, pending = wait(futures, timeout=FETCH_DEADLINE)
+        if pending:
+            logger.warning(f"{len(pending)} fetches missed the deadline")
+            self.pending = {future for future in pending if not future.cancel()}
+            return False
 
-    def fetch_order_books(self):
-        self.spot_order_books = {}
-        self.hedge_order_books = {}
+        self.spot_balances, self.hedge_balances = {}, {}
+        self.spot_order_books, self.hedge_order_books = {}, {}
+        for future, (attribute, exchange) in futures.items():
+            getattr(self, attribute)[exchange] = future.result()
 
-        for spot_exchange, spot_api in self.spot_apis.items():
-            spot_order_book = spot_api.fetch_order_book(self.spot_ticker, 20)
-            depth = {
-                "asks": spot_order_book["asks"],
-                "bids": spot_order_book["bids"],
-            }
+        return True
 
-            self.spot_order_books[spot_exchange] = depth
+    def close(self):
+        """Stops the fetch threads and the price watcher of a stopped bot"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.pending = set()
+        self.close_watcher()
 
-        for hedge_exchange, hedge_api in self.hedge_apis.items():
-            hedge_order_book = hedge_api.fetch_order_book(self.hedge_ticker, 20)
-            depth = {
-                "asks": hedge_order_book["asks"],
-                "bids": hedge_order_book["bids"],
-            }
+    def close_watcher(self):
+        try:
+            if self.watcher is not None:
+                self.watcher.close()
+        except:
+            logger.error(traceback.format_exc())
+        self.watcher = None
 
-            self.hedge_order_books[hedge_exchange] = depth
+    def record_latency(self, started, fetched):
+        """Keeps how long the fetches took and how old they were at decision time"""
+        decided = perf_counter()
+        fetch_ms = (fetched - started) * 1000
+        decision_ms = (decided - started) * 1000
+        self.latencies.append({"fetch_ms": fetch_ms, "decision_ms": decision_ms})
+        logger.info(f"Fetched in {fetch_ms:.0f} ms, decided after {decision_ms:.0f} ms")
 
     def find_profitable_open_deal(self):
         spot_exchanges = self.spot_order_books.keys()
@@ -281,78 +314,18 @@ class HedgeBotClass:
         return None
 
     def get_transactions(self, exchange, side):
-        exchange_object = Exchange.objects.get(exchange_id=exchange)
-        if side == "spot":
-            transactions = list(
-                HedgeBotTx.objects.filter(bot=self.bot, spot_exchange=exchange_object)
-                .order_by("created_at")
-                .values()
-            )
-        elif side == "hedge":
-            transactions = list(
-                HedgeBotTx.objects.filter(bot=self.bot, hedge_exchange=exchange_object)
-                .order_by("created_at")
-                .values()
-            )
-
-        return transactions
+        return self.ledger.transactions(exchange, side)
 
     def is_exchange_has_open_position(self, exchange, side):
-        exchange_object = Exchange.objects.get(exchange_id=exchange)
-        position_size = 0
-        price = None
-
-        if side == "spot":
-            transactions = HedgeBotTx.objects.filter(
-                bot=self.bot, spot_exchange=exchange_object
-            )
-        elif side == "hedge":
-            transactions = HedgeBotTx.objects.filter(
-                bot=self.bot, hedge_exchange=exchange_object
-            )
-
-        for transaction in transactions:
-            price = transaction.spot_cost_price
-            if transaction.side == "open":
-                position_size += transaction.spot_quantity
-            elif transaction.side == "close":
-                position_size -= transaction.spot_quantity
-
-        if position_size > 0:
-            return position_size * price > self.tx_size * 0.8
-        else:
-            return False
+        return self.ledger.has_open_position(exchange, side, self.tx_size * 0.8)
 
     def total_open_position_size(self, exchange, side):
-        exchange_object = Exchange.objects.get(exchange_id=exchange)
-        position_size = 0
-        price = None
-
-        if side == "spot":
-            transactions = HedgeBotTx.objects.filter(
-                bot=self.bot, spot_exchange=exchange_object
-            )
-        elif side == "hedge":
-            transactions = HedgeBotTx.objects.filter(
-                bot=self.bot, hedge_exchange=exchange_object
-            )
-
-        for transaction in transactions:
-            price = transaction.spot_cost_price
-            if transaction.side == "open":
-                position_size += transaction.spot_quantity
-            elif transaction.side == "close":
-                position_size -= transaction.spot_quantity
-
-        return position_size
+        return self.ledger.position_size(exchange, side)
 
     def get_average_costs(self, spot_exchange, hedge_exchange):
         # TODO: ortalama hesaplarken borsa önemli mi yoksa genel ortalama mı bakılmalı
-        spot_transactions = self.get_transactions(spot_exchange, "spot")
-        hedge_transactions = self.get_transactions(hedge_exchange, "hedge")
-
-        spot_avg_cost = calculate_spot_fifo_average_cost(spot_transactions)
-        hedge_avg_cost = calculate_hedge_fifo_average_cost(hedge_transactions)
+        spot_avg_cost = self.ledger.average_cost(spot_exchange, "spot")
+        hedge_avg_cost = self.ledger.average_cost(hedge_exchange, "hedge")
 
         logger.info(
             f"Spot average cost: {spot_avg_cost} \n Hedge average cost: {hedge_avg_cost}"
@@ -493,6 +466,7 @@ class HedgeBotClass:
             hedge_quantity=hedge_quantity,
             fee=fee,
         )
+        self.ledger.record(tx)
 
         return tx
 
@@ -537,6 +511,7 @@ class HedgeBotClass:
             hedge_quantity=hedge_quantity,
             fee=fee,
         )
+        self.ledger.record(tx)
 
         return tx
 
@@ -632,10 +607,13 @@ class HedgeBotClass:
         logger.info(f"Tx: {tx.__dict__}")
 
     def bot_session(self):
-        self.fetch_account_balances()
+        started = perf_counter()
+        if not self.fetch_market_data():
+            return False
+
+        fetched = perf_counter()
         logger.debug(f"Spot balances: {self.spot_balances}")
         logger.debug(f"Hedge balances: {self.hedge_balances}")
-        self.fetch_order_books()
         logger.debug(f"Spot order books: {self.spot_order_books}")
         logger.debug(f"Hedge order books: {self.hedge_order_books}")
 
@@ -643,27 +621,111 @@ class HedgeBotClass:
 
         deal = self.find_profitable_close_deal()
         if deal:
+            self.record_latency(started, fetched)
             self.execute_close_deal(deal)
             return True
 
         deal = self.find_profitable_open_deal()
+        self.record_latency(started, fetched)
         if deal:
             self.execute_open_deal(deal)
             return True
 
+    def price_channels(self):
+        return [price_channel(self.spot_ticker), price_channel(self.hedge_ticker)]
+
+    def update_top_of_book(self, message):
+        """Applies a price event, True if it is about one of the bot's exchanges"""
+        side = "spot" if message["type"] == "spot" else "hedge"
+        apis = self.spot_apis if side == "spot" else self.hedge_apis
+        if message["exchange"] not in apis:
+            return False
+
+        self.top_of_book[(side, message["exchange"])] = (message["bid"], message["ask"])
+        return True
+
+    def seed_top_of_book(self):
+        for side in ("spot", "hedge"):
+            for exchange, depth in getattr(self, f"{side}_order_books", {}).items():
+                bid = depth["bids"][0][0] if depth["bids"] else None
+                ask = depth["asks"][0][0] if depth["asks"] else None
+                self.top_of_book[(side, exchange)] = (bid, ask)
+
+    def in_wake_band(self):
+        """True when the top of book spread of a spot/hedge pair is within WAKE_BAND
+        of min_open_profit, or of min_close_profit for pairs with open positions
+        """
+        for spot_exchange in self.spot_apis:
+            spot_bid, spot_ask = self.top_of_book.get(("spot", spot_exchange), (0, 0))
+
+            for hedge_exchange in self.hedge_apis:
+                hedge_bid, hedge_ask = self.top_of_book.get(
+                    ("hedge", hedge_exchange), (0, 0)
+                )
+
+                if spot_ask and hedge_bid:
+                    open_rate = calculate_spread_rate(spot_ask, hedge_bid)
+                    if open_rate > self.min_open_profit - WAKE_BAND:
+                        return True
+
+                if not (
+                    spot_bid
+                    and hedge_ask
+                    and self.is_exchange_has_open_position(spot_exchange, "spot")
+                    and self.is_exchange_has_open_position(hedge_exchange, "hedge")
+                ):
+                    continue
+
+                try:
+                    close_rate = self.calculate_close_profit_rate(
+                        spot_exchange,
+                        hedge_exchange,
+                        spot_bid,
+                        hedge_ask,
+                        self.ledger.average_cost(spot_exchange, "spot"),
+                        self.ledger.average_cost(hedge_exchange, "hedge"),
+                    )
+                except ZeroDivisionError:
+                    continue
+
+                if close_rate > self.min_close_profit - WAKE_BAND:
+                    return True
+
+        return False
+
+    def wait_for_wakeup(self):
+        """Sleeps until prices near a deal or the heartbeat, 3s with wake-ups off"""
+        if settings.HEDGE_BOT_WAKEUPS != "events":
+            sleep(3)
+            return
+
+        self.seed_top_of_book()
+        try:
+            if self.watcher is None:
+                self.watcher = PriceWatcher(self)
+            reason = self.watcher.wait()
+            logger.debug(f"Woken by {reason}")
+        except:
+            logger.error(traceback.format_exc())
+            self.close_watcher()
+            sleep(3)
+
     def run(self):
-        while True:
-            try:
-                bot_status = self.check_bot_status()
-                if bot_status == "STOP":
-                    return False
+        try:
+            while True:
+                try:
+                    bot_status = self.check_bot_status()
+                    if bot_status == "STOP":
+                        return False
 
-                self.set_bot_settings()
-                self.check_idle_status()
+                    self.set_bot_settings()
+                    self.check_idle_status()
 
-                session_status = self.bot_session()
-                sleep(3)
+                    session_status = self.bot_session()
+                    self.wait_for_wakeup()
 
-            except:
-                logger.error(traceback.format_exc())
-                sleep(15)
+                except:
+                    logger.error(traceback.format_exc())
+                    sleep(15)
+        finally:
+            self.close()
@@ -4,12 +4,10 @@ from datetime import datetime, timedelta
 from django.utils.timezone import now
 import os
 import traceback
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from octochain.celery import app
 
-import ccxt
-
 from hedge_bot.models import (
     HedgeBot,
     HedgeBotTx,
@@ -18,13 +16,17 @@ from hedge_bot.models import (
     HedgeBotBlacklist,
 )
 from crypto.business_functions import (
-    calculate_avg_price,
     calculate_spread_rate,
     determine_price_str,
     calculate_spot_fifo_average_cost,
     calculate_hedge_fifo_average_cost,
 )
 from hedge_bot.bot.hedge_bot import HedgeBotClass
+from crypto.candles import CandleStore
+from crypto.client_pool import get_client
+from crypto.depth import depth_average_prices
+from crypto.order_books import get_order_book
+from crypto.scanner import find_spot_perp_arbitrages
 
 
 logger = logging.getLogger(__name__)
@@ -35,6 +37,9 @@ User = get_user_model()
 
 @app.task
 def run_hedge_bot(bot_id):
+    if settings.HEDGE_BOT_RUNTIME == "asyncio":
+        return  # Active bots are picked up by run_bot_runtime
+
     bot = HedgeBotClass(bot_id)
     bot.run()
 
@@ -59,6 +64,7 @@ class HedgeBotOpenClass:
             {"budget": 100, "profit_rate": 0.0085},
         ]
         self.min_volume = 100000
+        self.candle_store = CandleStore()
 
     def setup_logger(self):
         filepath = f"logs/{self.user}/HedgeBot"
@@ -97,28 +103,19 @@ class HedgeBotOpenClass:
                 "apiKey": public_key,
                 "secret": private_key,
                 "password": group,
-                "options": {
-                    "defaultType": None,
-                },
             }
 
             if exchange_id == "bitmart":
                 params["uid"] = group
 
             if exchange_object.spot:
-                params["options"]["defaultType"] = "spot"
-                exchange_class = getattr(ccxt, exchange_id)
-                exchange_class = exchange_class(params)
-                markets = exchange_class.load_markets()
+                exchange_class = get_client(exchange_id, "spot", params)
 
                 spot_apis[exchange_id] = exchange_class
                 fees["spot"][exchange_id] = exchange_object.spot_fee
 
             if exchange_object.future:
-                params["options"]["defaultType"] = "swap"
-                exchange_class = getattr(ccxt, exchange_id)
-                exchange_class = exchange_class(params)
-                markets = exchange_class.load_markets()
+                exchange_class = get_client(exchange_id, "swap", params)
 
                 hedge_apis[exchange_id] = exchange_class
                 fees["hedge"][exchange_id] = exchange_object.future_fee
@@ -126,59 +123,13 @@ class HedgeBotOpenClass:
         return spot_apis, hedge_apis, fees
 
     def find_all_hedge_positions(self):
-        spot = cache.get("spot")
-        swap = cache.get("swap")
-
-        arbitrages = []
-
-        for coin in spot.values():
-            coin_symbol = coin["symbol"]
-            coin_exchanges = coin["exchanges"]
-
-            if coin["quote"] != "USDT":
-                continue
-
-            for from_exchange, from_exchange_values in coin_exchanges.items():
-                if from_exchange not in self.spot_apis.keys():
-                    continue
-
-                if from_exchange_values["quoteVolume"] < self.min_volume:
-                    continue
-
-                hedge_symbol = f"{coin_symbol}:USDT"
-                if not hedge_symbol in swap.keys():
-                    continue
-
-                hedge_coin = swap[hedge_symbol]
-                hedge_coin_exchanges = hedge_coin["exchanges"]
-
-                for (
-                    hedge_exchange,
-                    hedge_exchange_values,
-                ) in hedge_coin_exchanges.items():
-                    if hedge_exchange not in self.hedge_apis.keys():
-                        continue
-
-                    if hedge_exchange_values["quoteVolume"] < self.min_volume:
-                        continue
-
-                    try:
-                        buy_price = from_exchange_values["ask"]
-                        sell_price = (
-                            hedge_exchange_values["bid"]
-                            or hedge_exchange_values["last"]
-                        )
-                        profit_rate = (sell_price / buy_price) - 1
-                    except:
-                        continue
-
-                    if self.min_profit_rate < profit_rate < self.max_profit_rate:
-                        arbitrage = {
-                            "from": from_exchange_values,
-                            "hedge": hedge_exchange_values,
-                            "profit_rate": profit_rate,
-                        }
-                        arbitrages.append(arbitrage)
+        arbitrages = find_spot_perp_arbitrages(
+            self.min_profit_rate,
+            self.max_profit_rate,
+            spot_exchanges=self.spot_apis.keys(),
+            hedge_exchanges=self.hedge_apis.keys(),
+            min_volume=self.min_volume,
+        )
 
         logger.debug(f"Arbitrages: {arbitrages}")
         logger.info(f"Arbitrages: {len(arbitrages)}")
@@ -223,23 +174,16 @@ class HedgeBotOpenClass:
             interval = "5m"
             limit = 100
 
-        spot_candles = self.spot_apis[spot_exchange].fetch_ohlcv(
-            spot_symbol, interval, limit=limit
-        )
-        swap_candles = self.hedge_apis[hedge_exchange].fetch_ohlcv(
-            hedge_symbol, interval, limit=limit
+        spread = self.candle_store.spread_stats(
+            self.spot_apis[spot_exchange],
+            spot_symbol,
+            self.hedge_apis[hedge_exchange],
+            hedge_symbol,
+            interval,
+            limit,
         )
 
-        differences = []
-        for i in range(len(spot_candles)):
-            spot_candle = spot_candles[i]
-            swap_candle = swap_candles[i]
-
-            if spot_candle[0] == swap_candle[0]:
-                spread = (swap_candle[3] / spot_candle[3]) - 1
-                differences.append(spread)
-
-        return sum(differences) / len(differences)
+        return spread["mean"]
 
     def calculate_hedge_positions(self, arbitrages):
         for arbitrage in arbitrages:
@@ -259,15 +203,15 @@ class HedgeBotOpenClass:
                 continue
 
             try:
-                spot_order_books = self.spot_apis[spot_exchange].fetch_order_book(
-                    spot_symbol, limit=20
+                spot_order_books = get_order_book(
+                    self.spot_apis[spot_exchange], spot_symbol, 20
                 )
                 spot_asks = spot_order_books["asks"]
                 spot_bids = spot_order_books["bids"]
                 spot_spread = calculate_spread_rate(spot_bids[0][0], spot_asks[0][0])
 
-                hedge_order_books = self.hedge_apis[hedge_exchange].fetch_order_book(
-                    hedge_symbol, limit=20
+                hedge_order_books = get_order_book(
+                    self.hedge_apis[hedge_exchange], hedge_symbol, 20
                 )
                 hedge_bids = hedge_order_books["bids"]
                 hedge_asks = hedge_order_books["asks"]
@@ -278,15 +222,17 @@ class HedgeBotOpenClass:
                 print(arbitrage)
                 continue
 
+            budgets = [level["budget"] for level in self.desired_budget_levels]
+            spot_fills = depth_average_prices(spot_asks, budgets)
+            hedge_fills = depth_average_prices(hedge_bids, budgets)
+
             found = 0
             budget_levels = []
-            for budget_level in self.desired_budget_levels:
-                avg_spot_ask, spot_reached = calculate_avg_price(
-                    spot_asks, budget_level["budget"]
-                )
-                avg_hedge_bid, hedge_reached = calculate_avg_price(
-                    hedge_bids, budget_level["budget"]
-                )
+            for budget_level, spot_fill, hedge_fill in zip(
+                self.desired_budget_levels, spot_fills, hedge_fills
+            ):
+                avg_spot_ask, spot_reached = spot_fill
+                avg_hedge_bid, hedge_reached = hedge_fill
 
                 if spot_reached and hedge_reached:
                     profit_rate = (avg_hedge_bid / avg_spot_ask) - 1
@@ -0,0 +1,83 @@
+from collections import defaultdict
+
+from crypto.lots import FifoLots
+from hedge_bot.models import HedgeBotTx, Exchange
+
+
+class PositionLedger:
+    """Running positions of one bot per (exchange, side), kept in memory
+
+    Loaded from the bot's HedgeBotTx rows once and fed every transaction the
+    bot creates afterwards. Positions follow the sums HedgeBotClass used to
+    recompute from the database: both sides count spot_quantity and are priced
+    at the spot_cost_price of their latest transaction.
+    """
+
+    def __init__(self, bot):
+        self.positions = {}
+        self.rows = defaultdict(list)
+        self.lots = {}
+        self.last_tx_date = None
+
+        exchange_ids = dict(Exchange.objects.values_list("id", "exchange_id"))
+        rows = HedgeBotTx.objects.filter(bot=bot).order_by("created_at", "id").values()
+        for row in rows:
+            self.apply(
+                row,
+                exchange_ids[row["spot_exchange_id"]],
+                exchange_ids[row["hedge_exchange_id"]],
+            )
+
+    def apply(self, row, spot_exchange, hedge_exchange):
+        for exchange, side in ((spot_exchange, "spot"), (hedge_exchange, "hedge")):
+            position = self.positions.setdefault(
+                (exchange, side), {"size": 0, "price": None}
+            )
+            if row["side"] == "open":
+                position["size"] += row["spot_quantity"]
+            elif row["side"] == "close":
+                position["size"] -= row["spot_quantity"]
+            position["price"] = row["spot_cost_price"]
+
+            self.rows[(exchange, side)].append(row)
+
+            lots = self.lots.get((exchange, side))
+            if lots is None:
+                lots = FifoLots(f"{side}_quantity", f"{side}_cost_price")
+                self.lots[(exchange, side)] = lots
+            lots.apply(row)
+
+        if self.last_tx_date is None or row["created_at"] > self.last_tx_date:
+            self.last_tx_date = row["created_at"]
+
+    def record(self, tx):
+        """Adds a transaction the bot has just inserted"""
+        row = {field.attname: getattr(tx, field.attname) for field in tx._meta.fields}
+        self.apply(row, tx.spot_exchange.exchange_id, tx.hedge_exchange.exchange_id)
+
+    def position_size(self, exchange, side):
+        position = self.positions.get((exchange, side))
+        return position["size"] if position else 0
+
+    def notional(self, exchange, side):
+        position = self.positions.get((exchange, side))
+        if not position or position["price"] is None:
+            return 0
+        return position["size"] * position["price"]
+
+    def has_open_position(self, exchange, side, min_notional):
+        position = self.positions.get((exchange, side))
+        if not position or position["size"] <= 0:
+            return False
+        return position["size"] * position["price"] > min_notional
+
+    def average_cost(self, exchange, side):
+        """FIFO average cost of the open lots, as calculate_*_fifo_average_cost"""
+        lots = self.lots.get((exchange, side))
+        if lots is None:
+            raise ZeroDivisionError(f"No {side} lots on {exchange}")
+        return lots.average_cost()
+
+    def transactions(self, exchange, side):
+        """Transactions as HedgeBotTx.values() rows, copied so callers may modify them"""
+        return [dict(row) for row in self.rows.get((exchange, side), [])]
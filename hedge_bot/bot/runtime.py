@@ -0,0 +1,339 @@
+import asyncio
+import contextvars
+import logging
+import logging.handlers
+import os
+import random
+import traceback
+from time import perf_counter
+
+import ccxt.async_support as ccxt_async
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+from crypto.client_pool import METADATA_CHECK_INTERVAL, attach_metadata, get_metadata
+from crypto.http_transport import create_aiohttp_session
+from crypto.order_books import async_get_order_book
+from hedge_bot.bot.hedge_bot import FETCH_DEADLINE, HedgeBotClass
+from hedge_bot.bot.wakeups import PriceWakeups
+from hedge_bot.models import HedgeBot
+
+
+logger = logging.getLogger(__name__)
+
+SESSION_INTERVAL = 3
+ERROR_INTERVAL = 15
+SUPERVISE_INTERVAL = 10
+# Sessions fetching and deciding at the same time, the rest wait their turn
+MAX_CONCURRENT_SESSIONS = 50
+
+current_bot = contextvars.ContextVar("current_bot", default=None)
+
+
+class BotLogHandler(logging.Handler):
+    """Routes hedge bot records to the log file of the bot whose task emitted them"""
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = {}
+
+    def add(self, bot_id, path):
+        if bot_id in self.handlers:
+            return
+
+        f_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=10 * 1024 * 1024, backupCount=5
+        )
+        f_handler.setFormatter(
+            logging.Formatter(
+                "%(asctime)s :: %(levelname)s :: %(lineno)d :: %(message)s",
+                datefmt="%d-%m-%Y %H:%M:%S",
+            )
+        )
+        self.handlers[bot_id] = f_handler
+
+    def remove(self, bot_id):
+        f_handler = self.handlers.pop(bot_id, None)
+        if f_handler is not None:
+            f_handler.close()
+
+    def emit(self, record):
+        f_handler = self.handlers.get(current_bot.get())
+        if f_handler is not None:
+            f_handler.handle(record)
+
+
+bot_logs = BotLogHandler()
+logging.getLogger("hedge_bot.bot.hedge_bot").addHandler(bot_logs)
+
+
+class AsyncClientPool:
+    """Async ccxt clients per credentials, sharing one aiohttp session
+
+    Market metadata is attached by refresh(), which reads it on a worker thread
+    so the Redis round trips never block the event loop.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.clients = {}
+        self.metadata = {}
+
+    def get(self, sync_client):
+        credentials = {
+            "apiKey": sync_client.apiKey,
+            "secret": sync_client.secret,
+            "password": sync_client.password,
+            "uid": sync_client.uid,
+        }
+        default_type = sync_client.options["defaultType"]
+        key = (sync_client.id, default_type, tuple(sorted(credentials.items())))
+
+        if self.session is None:
+            self.session = create_aiohttp_session()
+
+        exchange = self.clients.get(key)
+        if exchange is None:
+            exchange_class = getattr(ccxt_async, sync_client.id)
+            exchange = exchange_class(
+                {
+                    **{k: v for k, v in credentials.items() if v},
+                    "session": self.session,
+                    "options": {
+                        "defaultType": default_type,
+                    },
+                }
+            )
+            self.clients[key] = exchange
+
+        return exchange
+
+    async def refresh(self):
+        """Attaches the current market metadata to the clients where it changed"""
+        get = sync_to_async(get_metadata, thread_sensitive=False)
+        exchange_ids = {key[0] for key in self.clients}
+        for exchange_id in exchange_ids:
+            metadata = await get(exchange_id)
+            for key, exchange in list(self.clients.items()):
+                if key[0] == exchange_id and self.metadata.get(key) is not metadata:
+                    attach_metadata(exchange, metadata)
+                    self.metadata[key] = metadata
+
+    async def refresh_loop(self):
+        while True:
+            await asyncio.sleep(METADATA_CHECK_INTERVAL)
+            try:
+                await self.refresh()
+            except:
+                logger.error(traceback.format_exc())
+
+    async def close(self):
+        await asyncio.gather(
+            *(exchange.close() for exchange in self.clients.values()),
+            return_exceptions=True,
+        )
+        self.clients = {}
+        self.metadata = {}
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+async def run_in_thread(func, *args):
+    """Runs a blocking order flow on its own thread so it never holds up other bots"""
+
+    def call():
+        try:
+            return func(*args)
+        finally:
+            connections.close_all()
+
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+class AsyncHedgeBot(HedgeBotClass):
+    """HedgeBotClass whose market reads run as coroutines on async ccxt clients
+
+    Balances and order books are awaited concurrently, positions come from the
+    in-memory ledger, the remaining database reads go through sync_to_async and
+    order execution keeps the sync clients on a worker thread, so hundreds of
+    sessions can share one process.
+    """
+
+    def setup_async_apis(self, clients):
+        self.async_spot_apis = {
+            exchange: clients.get(api) for exchange, api in self.spot_apis.items()
+        }
+        self.async_hedge_apis = {
+            exchange: clients.get(api) for exchange, api in self.hedge_apis.items()
+        }
+
+    def setup_logger(self):
+        filepath = f"logs/{self.bot.user}/HedgeBot"
+        if not os.path.exists(filepath):
+            os.makedirs(filepath)
+
+        bot_logs.add(self.bot_id, f"{filepath}/{self.tick}.log")
+
+    async def async_fetch_balances(self, api, ticks):
+        return self.parse_balances(await api.fetch_balance(), ticks)
+
+    async def async_fetch_depth(self, api, ticker):
+        order_book = await async_get_order_book(api, ticker, 20)
+        return {"asks": order_book["asks"], "bids": order_book["bids"]}
+
+    async def async_fetch_market_data(self):
+        """fetch_market_data on the event loop, every call awaited together"""
+        targets, calls = [], []
+        for side in ("spot", "hedge"):
+            apis = getattr(self, f"async_{side}_apis")
+            ticker = self.spot_ticker if side == "spot" else self.hedge_ticker
+            ticks = ["USDT", self.tick] if side == "spot" else ["USDT"]
+
+            for exchange, api in apis.items():
+                targets.append((f"{side}_balances", exchange))
+                calls.append(self.async_fetch_balances(api, ticks))
+                targets.append((f"{side}_order_books", exchange))
+                calls.append(self.async_fetch_depth(api, ticker))
+
+        results = await asyncio.gather(*calls)
+
+        self.spot_balances, self.hedge_balances = {}, {}
+        self.spot_order_books, self.hedge_order_books = {}, {}
+        for (attribute, exchange), result in zip(targets, results):
+            getattr(self, attribute)[exchange] = result
+
+    async def async_bot_session(self):
+        started = perf_counter()
+        try:
+            await asyncio.wait_for(self.async_fetch_market_data(), FETCH_DEADLINE)
+        except asyncio.TimeoutError:
+            logger.warning(f"Bot {self.bot_id} fetches missed the deadline")
+            return False
+
+        fetched = perf_counter()
+        deal = self.find_profitable_close_deal()
+        if deal:
+            self.record_latency(started, fetched)
+            await run_in_thread(self.execute_close_deal, deal)
+            return True
+
+        deal = self.find_profitable_open_deal()
+        self.record_latency(started, fetched)
+        if deal:
+            await run_in_thread(self.execute_open_deal, deal)
+            return True
+
+    async def async_run_once(self):
+        """One iteration of HedgeBotClass.run, returns STOP when the bot is disabled"""
+        bot_status = await sync_to_async(self.check_bot_status)()
+        if bot_status == "STOP":
+            return bot_status
+
+        self.set_bot_settings()
+        await sync_to_async(self.check_idle_status)()
+
+        return await self.async_bot_session()
+
+
+def active_bot_ids(shard=0, shards=1):
+    bot_ids = HedgeBot.objects.filter(status=True).values_list("id", flat=True)
+    return {bot_id for bot_id in bot_ids if bot_id % shards == shard}
+
+
+class BotRuntime:
+    """Hosts every active hedge bot of a shard as a task on one event loop"""
+
+    def __init__(
+        self,
+        shard=0,
+        shards=1,
+        bot_class=AsyncHedgeBot,
+        interval=SESSION_INTERVAL,
+        wakeups=False,
+    ):
+        self.shard = shard
+        self.shards = shards
+        self.bot_class = bot_class
+        self.interval = interval
+        # Price event wake-ups replace the fixed interval between sessions
+        self.wakeups = PriceWakeups() if wakeups else None
+        self.clients = AsyncClientPool()
+        self.tasks = {}
+        self.semaphore = None
+
+    async def run_bot(self, bot_id):
+        current_bot.set(bot_id)
+        bot = None
+
+        try:
+            bot = await sync_to_async(self.bot_class)(bot_id)
+            bot.setup_async_apis(self.clients)
+            await self.clients.refresh()
+            if self.wakeups is not None:
+                self.wakeups.add(bot)
+            # Spread the sessions of bots started together over the interval
+            await asyncio.sleep(random.uniform(0, self.interval))
+
+            while True:
+                try:
+                    async with self.semaphore:
+                        status = await bot.async_run_once()
+                    if status == "STOP":
+                        logger.info(f"Bot {bot_id} stopped")
+                        return
+
+                    if self.wakeups is None:
+                        await asyncio.sleep(self.interval)
+                    else:
+                        bot.seed_top_of_book()
+                        await self.wakeups.wait(bot)
+
+                except asyncio.CancelledError:
+                    raise
+                except:
+                    logger.error(traceback.format_exc())
+                    await asyncio.sleep(ERROR_INTERVAL)
+        finally:
+            bot_logs.remove(bot_id)
+            if self.wakeups is not None and bot is not None:
+                self.wakeups.remove(bot)
+
+    def start_bot(self, bot_id):
+        self.tasks[bot_id] = asyncio.ensure_future(self.run_bot(bot_id))
+
+    async def supervise(self):
+        """Starts newly activated bots, restarts failed ones and drops disabled ones"""
+        active = await sync_to_async(active_bot_ids)(self.shard, self.shards)
+
+        for bot_id in active:
+            task = self.tasks.get(bot_id)
+            if task is None or task.done():
+                if task is not None and not task.cancelled() and task.exception():
+                    logger.error(f"Bot {bot_id} failed: {task.exception()!r}")
+                self.start_bot(bot_id)
+
+        for bot_id in list(self.tasks):
+            if bot_id not in active:
+                self.tasks.pop(bot_id).cancel()
+
+    async def run(self):
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_SESSIONS)
+        refresher = asyncio.ensure_future(self.clients.refresh_loop())
+        try:
+            while True:
+                try:
+                    await self.supervise()
+                    logger.info(f"{len(self.tasks)} bots running")
+                except:
+                    logger.error(traceback.format_exc())
+
+                await asyncio.sleep(SUPERVISE_INTERVAL)
+        finally:
+            refresher.cancel()
+            for task in self.tasks.values():
+                task.cancel()
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+            await self.clients.close()
+            if self.wakeups is not None:
+                await self.wakeups.close()
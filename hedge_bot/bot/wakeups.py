@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+import traceback
+from collections import defaultdict
+
+import orjson
+import redis.asyncio as aioredis
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from crypto.events import PRICES_PREFIX
+
+
+logger = logging.getLogger(__name__)
+
+# Sessions run at most this often while prices stay in the wake band
+MIN_WAKE_INTERVAL = 1
+# Seconds a bot sleeps at most, so status, idle and missed prices are checked.
+# Kept within the 20s REST price ingest, the only event source of most exchanges
+HEARTBEAT_INTERVAL = 15
+
+
+class PriceWatcher:
+    """Blocks a bot between sessions until its prices enter the wake band"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        connection = get_redis_connection("default")
+        self.pubsub = connection.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(*bot.price_channels())
+
+    def apply_messages(self, timeout, until_band=True):
+        """Applies price events for up to timeout seconds, True once in the band
+
+        With until_band False the whole timeout is spent applying events.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            message = self.pubsub.get_message(timeout=remaining)
+            if message is None:
+                continue
+
+            if self.bot.update_top_of_book(orjson.loads(message["data"])):
+                if until_band and self.bot.in_wake_band():
+                    return True
+
+    def wait(self, heartbeat=HEARTBEAT_INTERVAL, min_interval=MIN_WAKE_INTERVAL):
+        """Returns "price" when a deal may be near, "heartbeat" when nothing moved"""
+        self.apply_messages(min_interval, until_band=False)
+        if self.bot.in_wake_band():
+            return "price"
+
+        if self.apply_messages(heartbeat - min_interval):
+            return "price"
+        return "heartbeat"
+
+    def close(self):
+        self.pubsub.close()
+
+
+class PriceWakeups:
+    """One Redis pattern subscription for every bot of the runtime"""
+
+    def __init__(self, url=None):
+        self.url = url or settings.CACHES["default"]["LOCATION"]
+        self.bots = defaultdict(set)
+        self.events = {}
+        self.listener = None
+
+    def add(self, bot):
+        for channel in bot.price_channels():
+            self.bots[channel.encode()].add(bot)
+        self.events[bot.bot_id] = asyncio.Event()
+
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.ensure_future(self.listen())
+
+    def remove(self, bot):
+        for channel in bot.price_channels():
+            bots = self.bots.get(channel.encode())
+            if bots is not None:
+                bots.discard(bot)
+                if not bots:
+                    del self.bots[channel.encode()]
+        self.events.pop(bot.bot_id, None)
+
+    async def wait(
+        self, bot, heartbeat=HEARTBEAT_INTERVAL, min_interval=MIN_WAKE_INTERVAL
+    ):
+        """PriceWatcher.wait for a bot hosted on the event loop"""
+        await asyncio.sleep(min_interval)
+        if bot.in_wake_band():
+            return "price"
+
+        event = self.events[bot.bot_id]
+        event.clear()
+        try:
+            await asyncio.wait_for(event.wait(), heartbeat - min_interval)
+            return "price"
+        except asyncio.TimeoutError:
+            return "heartbeat"
+
+    def dispatch(self, channel, data):
+        bots = self.bots.get(channel)
+        if not bots:
+            return
+
+        message = orjson.loads(data)
+        for bot in bots:
+            if bot.update_top_of_book(message) and bot.in_wake_band():
+                event = self.events.get(bot.bot_id)
+                if event is not None:
+                    event.set()
+
+    async def listen(self):
+        backoff = 1
+
+        while True:
+            client = aioredis.from_url(self.url)
+            try:
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(f"{PRICES_PREFIX}*")
+
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self.dispatch(message["channel"], message["data"])
+                        backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except:
+                logger.error(traceback.format_exc())
+            finally:
+                await client.close()
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    async def close(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import resource
+import statistics
+import time
+import tracemalloc
+from collections import deque
+
+import ccxt.async_support as ccxt_async
+from django.core.management.base import CommandError
+
+from crypto.management.benchmark import BenchmarkCommand, percentile
+from hedge_bot.bot.runtime import MAX_CONCURRENT_SESSIONS, AsyncHedgeBot, BotRuntime
+
+
+SESSION_LATENCIES = []
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StandInExchange:
+    """Answers balance and order book calls after a simulated network latency"""
+
+    def __init__(self, exchange_id, latency):
+        self.id = exchange_id
+        self.latency = latency
+
+    async def fetch_balance(self):
+        await asyncio.sleep(self.latency)
+        return {"USDT": {"free": 1000.0, "total": 1000.0}}
+
+    async def fetch_order_book(self, symbol, limit=20):
+        await asyncio.sleep(self.latency)
+        return {
+            "asks": [[100 + i * 0.01, 1.5] for i in range(limit)],
+            "bids": [[100 - i * 0.01, 1.5] for i in range(limit)],
+        }
+
+
+class BenchBot(AsyncHedgeBot):
+    """AsyncHedgeBot on stand-in exchanges without a database, never takes a deal"""
+
+    latency = 0.05
+
+    def __init__(self, bot_id):
+        self.bot_id = bot_id
+        self.tick = f"BENCH{bot_id}"
+        self.spot_ticker = f"{self.tick}/USDT"
+        self.hedge_ticker = f"{self.tick}/USDT:USDT"
+        self.fees = {"spot": {"binance": 0.001}, "hedge": {"okx": 0.0005}}
+
+        self.control_size = 100
+        self.tx_size = 25
+        self.min_open_profit = 1
+        self.min_close_profit = 1
+        self.latencies = deque(maxlen=100)
+
+    def setup_async_apis(self, clients):
+        self.async_spot_apis = {"binance": StandInExchange("binance", self.latency)}
+        self.async_hedge_apis = {"okx": StandInExchange("okx", self.latency)}
+
+    def check_bot_status(self):
+        return None
+
+    def check_idle_status(self):
+        return None
+
+    def set_bot_settings(self):
+        pass
+
+    def is_exchange_has_open_position(self, exchange, side):
+        return False
+
+    async def async_run_once(self):
+        start = time.perf_counter()
+        status = await super().async_run_once()
+        SESSION_LATENCIES.append((time.perf_counter() - start) * 1000)
+        return status
+
+
+class Command(BenchmarkCommand):
+    """Django command to measure memory per bot and bots per core of the bot runtime"""
+
+    rounds = None
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--bots", type=int, default=500)
+        parser.add_argument("--interval", type=float, default=3)
+        parser.add_argument("--latency", type=float, default=50, help="ms per call")
+        parser.add_argument("--duration", type=float, default=15)
+
+    def client_kb(self):
+        # The first instance also pays for class level setup
+        ccxt_async.binance()
+        tracemalloc.start()
+        exchange = ccxt_async.binance({"apiKey": "key", "secret": "secret"})
+        size = tracemalloc.get_traced_memory()[0] / 1024
+        tracemalloc.stop()
+        del exchange
+        return size
+
+    async def run_benchmark(self, bots, interval, duration):
+        runtime = BotRuntime(bot_class=BenchBot, interval=interval)
+        runtime.semaphore = asyncio.Semaphore(MAX_CONCURRENT_SESSIONS)
+
+        rss = rss_mb()
+        tracemalloc.start()
+        for bot_id in range(bots):
+            runtime.start_bot(bot_id)
+        await asyncio.sleep(interval * 2)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        rss = rss_mb() - rss
+
+        SESSION_LATENCIES.clear()
+        cpu = time.process_time()
+        await asyncio.sleep(duration)
+        cpu = time.process_time() - cpu
+        sessions = len(SESSION_LATENCIES)
+        latencies = sorted(SESSION_LATENCIES)
+
+        for task in runtime.tasks.values():
+            task.cancel()
+        await asyncio.gather(*runtime.tasks.values(), return_exceptions=True)
+
+        return memory, rss, cpu, sessions, latencies
+
+    def benchmark(self, options):
+        bots, interval = options["bots"], options["interval"]
+        duration = options["duration"]
+        BenchBot.latency = options["latency"] / 1000
+
+        baseline = rss_mb()
+        memory, rss, cpu, sessions, latencies = asyncio.run(
+            self.run_benchmark(bots, interval, duration)
+        )
+        if not sessions:
+            raise CommandError("No session finished")
+
+        cpu_per_session = cpu / sessions * 1000
+        expected = bots * duration / interval
+        p95 = percentile(latencies, 0.95)
+
+        self.stdout.write(
+            f"{bots} bots, {interval}s interval, {options['latency']:.0f} ms per call\n"
+            f"sessions:          {sessions} in {duration:.0f}s "
+            f"({sessions / expected:.0%} of schedule)\n"
+            f"session latency:   p50 {statistics.median(latencies):.1f} ms, "
+            f"p95 {p95:.1f} ms\n"
+            f"cpu per session:   {cpu_per_session:.2f} ms -> "
+            f"{interval * 1000 / cpu_per_session:.0f} bots per core\n"
+            f"memory per bot:    {memory / bots / 1024:.1f} KB traced, "
+            f"{rss * 1024 / bots:.1f} KB rss\n"
+            f"ccxt async client: {self.client_kb():.0f} KB, "
+            f"shared by the bots of one API key\n"
+            f"process baseline:  {baseline:.0f} MB rss, "
+            f"the floor of one Celery worker per bot"
+        )
@@ -0,0 +1,25 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from hedge_bot.bot.runtime import BotRuntime
+
+
+class Command(BaseCommand):
+    """Django command to run every active hedge bot of a shard in one process"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shard", type=int, default=0)
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=1,
+            help="Runtime processes, each hosts the bots whose id % shards == shard",
+        )
+
+    def handle(self, *args, **options):
+        shard, shards = options["shard"], options["shards"]
+        self.stdout.write(f"Running hedge bots of shard {shard}/{shards}")
+        wakeups = settings.HEDGE_BOT_WAKEUPS == "events"
+        asyncio.run(BotRuntime(shard, shards, wakeups=wakeups).run())
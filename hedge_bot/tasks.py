@@ -1,3 +1,5 @@
+from django.conf import settings
+
 from octochain.celery import app
 
 from hedge_bot.bot.hedge_bot import HedgeBotClass
@@ -6,6 +8,9 @@ from hedge_bot.bot.hedge_bot_open import HedgeBotOpenClass
 
 @app.task
 def run_hedge_bot(bot_id):
+    if settings.HEDGE_BOT_RUNTIME == "asyncio":
+        return  # Active bots are picked up by run_bot_runtime
+
     bot = HedgeBotClass(bot_id)
     bot.run()
 
@@ -1,20 +1,15 @@
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from django.utils.timezone import now
-from django.core.cache import cache
 
 from hedge_bot.models import HedgeBot, HedgeBotTx, Exchange, ExchangeApi
 from octofolio.models import Asset
 from hedge_bot.tasks import run_hedge_bot as run_hedge_bot_task
-
-import ccxt
+from crypto.client_pool import get_client
 
 
 @api_view(["GET"])
 def get_hedge_bots(request):
-    spot = cache.get("spot")
-    swap = cache.get("swap")
-
     hedge_bots = []
 
     hedge_bot_objects = HedgeBot.objects.filter().order_by("-created_at")
@@ -142,9 +137,6 @@ def get_exchange_funds(request):
             "apiKey": public_key,
             "secret": private_key,
             "password": group,
-            "options": {
-                "defaultType": None,
-            },
         }
         if exchange_id == "bitmart":
             params["uid"] = group
@@ -158,10 +150,7 @@ def get_exchange_funds(request):
         }
 
         if exchange_api.exchange.spot:
-            params["options"]["defaultType"] = "spot"
-            exchange_class = getattr(ccxt, exchange_id)
-            exchange_class = exchange_class(params)
-            exchange_class.markets = cache.get(f"{exchange_id}_markets")
+            exchange_class = get_client(exchange_id, "spot", params)
 
             spot_balance = exchange_class.fetch_balance()
 
@@ -176,10 +165,7 @@ def get_exchange_funds(request):
             fund["spot_fund"] = usdt
 
         if exchange_api.exchange.future:
-            params["options"]["defaultType"] = "swap"
-            exchange_class = getattr(ccxt, exchange_id)
-            exchange_class = exchange_class(params)
-            exchange_class.markets = cache.get(f"{exchange_id}_markets")
+            exchange_class = get_client(exchange_id, "swap", params)
 
             future_balance = exchange_class.fetch_balance()
             try:
@@ -3,6 +3,9 @@ ASGI config for octochain project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The market event stream is served here directly, so that long lived
+text/event-stream connections never hold a Django request thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
@@ -13,4 +16,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octochain.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from crypto.events import SSE_PATH, sse_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == SSE_PATH:
+        return await sse_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -91,13 +91,48 @@ DATABASES = {
     }
 }
 
+MARKET_CACHE_SERIALIZER = os.environ.get(
+    "MARKET_CACHE_SERIALIZER", "crypto.serializers.OrjsonSerializer"
+)
+MARKET_CACHE_COMPRESSOR = os.environ.get(
+    "MARKET_CACHE_COMPRESSOR", "django_redis.compressors.zstd.ZStdCompressor"
+)
+
+# Order books younger than this are served from Redis instead of the exchange
+ORDER_BOOK_FRESHNESS_MS = int(os.environ.get("ORDER_BOOK_FRESHNESS_MS", 300))
+
+# Notifications are queued in Redis and sent by the send_notifications task
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_BOT_TOKEN = os.environ.get(
+    "TELEGRAM_BOT_TOKEN", "5687151976:AAF94-ghuVdi3yBxDYwYzPC_MOHrM7D40pg"
+)
+TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID", "-1002000333988")
+
+# "asyncio" hosts active hedge bots in run_bot_runtime processes instead of one
+# Celery task per bot
+HEDGE_BOT_RUNTIME = os.environ.get("HEDGE_BOT_RUNTIME", "celery")
+# "poll" runs hedge bot sessions every 3s, "events" wakes them on price events near
+# their thresholds. Exchanges without a price stream publish events only on the
+# ~20s REST ingest, so "events" suits deployments streaming every bot exchange
+HEDGE_BOT_WAKEUPS = os.environ.get("HEDGE_BOT_WAKEUPS", "poll")
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": "redis://redis:6390/1",
         "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
         "KEY_PREFIX": "octochain",
-    }
+    },
+    "market": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://redis:6390/1",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "SERIALIZER": MARKET_CACHE_SERIALIZER,
+            "COMPRESSOR": MARKET_CACHE_COMPRESSOR,
+        },
+        "KEY_PREFIX": "octochain_market",
+    },
 }
 
 REDIS_HOST = "redis"
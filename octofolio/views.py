@@ -1,14 +1,15 @@
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from django.utils.timezone import now
-from django.core.cache import cache
 
 from octofolio.models import Asset, Portfolio, Transaction
+from crypto.market_cache import get_symbol_entries
 
 
 @api_view(["GET"])
 def get_portfolios(request):
-    spot = cache.get("spot")
+    asset_symbols = Asset.objects.values_list("symbol", flat=True)
+    spot = get_symbol_entries("spot", {f"{symbol}/USDT" for symbol in asset_symbols})
 
     portfolios = []
 
@@ -111,11 +112,12 @@ def get_portfolios(request):
 
 @api_view(["GET"])
 def get_assets_price_list(request):
-    spot = cache.get("spot")
-
     assets_price_list = []
 
     asset_objects = Asset.objects.all()
+    spot = get_symbol_entries(
+        "spot", {f"{asset_object.symbol}/USDT" for asset_object in asset_objects}
+    )
     for asset_object in asset_objects:
         asset_symbol = asset_object.symbol
 